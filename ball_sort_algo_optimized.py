@@ -1,9 +1,29 @@
 import tkinter as tk
-from tkinter import ttk, colorchooser, messagebox
+from tkinter import ttk, colorchooser, messagebox, filedialog
+import math
 import random
 from copy import deepcopy
+import os
+import sqlite3
+import threading
 import time
 
+import ball_sort_cache
+import ball_sort_format
+import ball_sort_solver as solver
+
+# Solutions are remembered between runs in this file
+SOLUTION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ball_sort_solutions.sqlite")
+
+# Frames per second the solution animation aims for
+ANIMATION_FPS = 60
+
+# Range of the animation speed slider in ms per move. The slider is
+# logarithmic, and its fast end is far below one frame per move, where
+# each frame makes several moves at once.
+MIN_MOVE_MS = 1
+MAX_MOVE_MS = 1000
+
 class BallSortPuzzleGUI:
     def __init__(self, root):
         self.root = root
@@ -32,10 +52,52 @@ class BallSortPuzzleGUI:
         self.stacks = ["gbbb", "ybry", "yggy", "rrrg", "", ""]
         self.grid = []
         self.selected_stack = None
-        self.animation_speed = 500  # ms
+        self.animation_speed = 500  # ms per move
         self.solution_steps = []
         self.current_step = 0
+        self.solution_start = []  # Grid the solution steps start from
         self.is_animating = False
+        self.move_progress = 0.0  # Part of the current step already played
+        self.last_frame = 0.0
+        self.animation_job = None  # Pending root.after of the next frame
+        
+        # Last solution found, reused by later solves and hints
+        self.known_solution = None
+        self.hint_requested = False
+        
+        # Canvas items, kept between draws: the layout they were drawn for,
+        # per tube its x and the balls' (oval, text, color) items bottom
+        # first, the grid they show and the selection marker with the
+        # stack it marks
+        self.canvas_layout = None
+        self.tube_x = []
+        self.ball_items = []
+        self.drawn_grid = []
+        self.selection_items = None
+        self.drawn_selection = None
+        self.flying = None  # (stack, first slot) of balls moved off their slots
+        
+        # Background solver state
+        self.solver_thread = None
+        self.solver_cancel = threading.Event()
+        self.solver_progress = None
+        self.solver_result = None
+        
+        # The game still works without the cache, e.g. in a read-only home
+        try:
+            self.solution_cache = ball_sort_cache.SolutionCache(SOLUTION_CACHE_PATH)
+        except sqlite3.Error:
+            self.solution_cache = None
+        
+        # Search modes offered in the control panel
+        self.search_modes = {
+            "A* (shortest)": "astar",
+            "Weighted A*": "weighted",
+            "Greedy": "greedy",
+            "Depth-first": "dfs",
+            "IDA* (low memory)": "ida",
+            "Bidirectional": "bidir",
+        }
         
         # Create frames
         self.create_frames()
@@ -91,11 +153,23 @@ class BallSortPuzzleGUI:
         speed_frame.pack(fill=tk.X, pady=5)
         
         tk.Label(speed_frame, text="Animation Speed:", bg="#e0e0e0").pack(side=tk.LEFT)
-        self.speed_scale = ttk.Scale(speed_frame, from_=50, to=1000, value=self.animation_speed, 
+        self.speed_scale = ttk.Scale(speed_frame, from_=0, to=1,
+                                    value=math.log(self.animation_speed / MIN_MOVE_MS,
+                                                   MAX_MOVE_MS / MIN_MOVE_MS),
                                     orient=tk.HORIZONTAL, length=150,
                                     command=lambda val: self.update_speed(float(val)))
         self.speed_scale.pack(side=tk.RIGHT)
         
+        # Search mode
+        mode_frame = tk.Frame(self.control_frame, bg="#e0e0e0")
+        mode_frame.pack(fill=tk.X, pady=5)
+        
+        tk.Label(mode_frame, text="Search Mode:", bg="#e0e0e0").pack(side=tk.LEFT)
+        self.search_mode_var = tk.StringVar(value="A* (shortest)")
+        mode_combo = ttk.Combobox(mode_frame, textvariable=self.search_mode_var, width=14,
+                                  values=list(self.search_modes), state="readonly")
+        mode_combo.pack(side=tk.RIGHT)
+        
         # Color customization
         color_label = tk.Label(self.control_frame, text="Customize Colors:", font=("Arial", 12), bg="#e0e0e0")
         color_label.pack(pady=(15, 5), anchor=tk.W)
@@ -121,6 +195,13 @@ class BallSortPuzzleGUI:
         self.solve_btn = tk.Button(btn_frame, text="Solve Puzzle", command=self.solve_puzzle)
         self.solve_btn.pack(fill=tk.X, pady=2)
         
+        self.hint_btn = tk.Button(btn_frame, text="Hint", command=self.show_hint)
+        self.hint_btn.pack(fill=tk.X, pady=2)
+        
+        self.cancel_btn = tk.Button(btn_frame, text="Cancel Solving", state=tk.DISABLED,
+                                    command=self.cancel_solve)
+        self.cancel_btn.pack(fill=tk.X, pady=2)
+        
         # Help button
         help_btn = tk.Button(self.control_frame, text="Help", command=self.show_help)
         help_btn.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
@@ -202,29 +283,48 @@ class BallSortPuzzleGUI:
             self.grid.append("")
     
     def draw_stacks(self):
-        self.canvas.delete("all")
-        
-        # Calculate dimensions
+        # Bring the canvas in line with self.grid. Tubes, labels and the
+        # selection marker are drawn once per layout (canvas size, board
+        # shape and colors); after that only the balls of tubes that
+        # changed are moved, recolored, created or deleted.
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
         
         if canvas_width <= 1:  # Canvas not yet fully initialized
             self.root.after(100, self.draw_stacks)
             return
-            
+        
+        self.land_balls()
+        layout = (canvas_width, canvas_height, self.numberOfStacks, self.stackHeight,
+                  tuple(self.colors.items()))
+        if layout != self.canvas_layout:
+            self.draw_tubes(canvas_width, canvas_height)
+            self.canvas_layout = layout
+        
+        self.update_balls()
+        self.update_selection()
+    
+    def draw_tubes(self, canvas_width, canvas_height):
+        # Start over with empty tubes for the current canvas size and board
+        self.canvas.delete("all")
+        
         stack_width = min(80, (canvas_width - 40) // self.numberOfStacks)
-        ball_radius = stack_width // 2 - 2
+        self.ball_radius = stack_width // 2 - 2
+        self.stack_width = stack_width
         spacing = (canvas_width - (stack_width * self.numberOfStacks)) // (self.numberOfStacks + 1)
         
         max_stack_height = self.stackHeight + 1  # +1 for some padding
-        tube_height = max_stack_height * (ball_radius * 2 + 2)
+        tube_height = max_stack_height * (self.ball_radius * 2 + 2)
+        self.tube_top = (canvas_height - tube_height) // 2
+        self.tube_bottom = self.tube_top + tube_height
         
         # Draw tubes
+        self.tube_x = []
+        y1, y2 = self.tube_top, self.tube_bottom
         for i in range(self.numberOfStacks):
             x1 = spacing + i * (stack_width + spacing)
-            y1 = (canvas_height - tube_height) // 2
             x2 = x1 + stack_width
-            y2 = y1 + tube_height
+            self.tube_x.append(x1)
             
             # Draw tube outline
             self.canvas.create_rectangle(x1, y1, x2, y2, outline="#888", width=2, fill="#f8f8f8")
@@ -236,33 +336,150 @@ class BallSortPuzzleGUI:
             # Draw stack number
             self.canvas.create_text(x1 + stack_width//2, y2 + 20, 
                                    text=str(i+1), font=("Arial", 12))
-            
-            # Draw selection indicator if this stack is selected
-            if i == self.selected_stack:
-                self.canvas.create_rectangle(x1-3, y1-25, x2+3, y1-5, 
-                                           fill="#ffcc00", outline="#ff8800", width=2)
-                self.canvas.create_text(x1 + stack_width//2, y1-15, 
-                                      text="Selected", font=("Arial", 8))
-            
-            # Draw balls in this stack
+        
+        # Selection indicator, moved over the selected stack when there is one
+        self.selection_items = (
+            self.canvas.create_rectangle(0, 0, 0, 0, fill="#ffcc00", outline="#ff8800",
+                                         width=2, state=tk.HIDDEN),
+            self.canvas.create_text(0, 0, text="Selected", font=("Arial", 8), state=tk.HIDDEN))
+        
+        self.ball_items = [[] for _ in range(self.numberOfStacks)]
+        self.drawn_grid = [""] * self.numberOfStacks
+        self.drawn_selection = None
+    
+    def ball_center(self, stack, slot):
+        # Canvas position of the ball at slot (0 = bottom) of stack
+        return (self.tube_x[stack] + self.stack_width//2,
+                self.tube_bottom - (slot+1) * (self.ball_radius*2 + 2))
+    
+    def update_balls(self):
+        # Take the balls off each changed tube down to where it still
+        # matches the grid, then fill the tubes up again, reusing the
+        # removed items (same color first) before creating new ones
+        spare = []
+        changed = []
+        for i, stack in enumerate(self.grid[:self.numberOfStacks]):
+            drawn = self.drawn_grid[i]
+            if stack == drawn:
+                continue
+            keep = 0
+            while keep < min(len(stack), len(drawn)) and stack[keep] == drawn[keep]:
+                keep += 1
+            items = self.ball_items[i]
+            while len(items) > keep:
+                spare.append(items.pop())
+            changed.append(i)
+        
+        for i in changed:
             stack = self.grid[i]
-            for j, ball in enumerate(stack):
-                ball_y = y2 - (j+1) * (ball_radius*2 + 2)
-                self.draw_ball(x1 + stack_width//2, ball_y, ball_radius, ball)
+            items = self.ball_items[i]
+            for j in range(len(items), len(stack)):
+                x, y = self.ball_center(i, j)
+                items.append(self.place_ball(spare, x, y, stack[j]))
+            self.drawn_grid[i] = stack
+        
+        for oval, text, _ in spare:
+            self.canvas.delete(oval, text)
+    
+    def place_ball(self, spare, x, y, color_char):
+        # Ball items for color_char at (x, y): a spare ball of that color
+        # moved there, another spare one recolored, or a new one
+        for k in range(len(spare) - 1, -1, -1):
+            if spare[k][2] == color_char:
+                oval, text, _ = spare.pop(k)
+                break
+        else:
+            if not spare:
+                return self.draw_ball(x, y, self.ball_radius, color_char)
+            oval, text, _ = spare.pop()
+            self.canvas.itemconfigure(oval, fill=self.colors.get(color_char, "#999999"))
+            self.canvas.itemconfigure(text, text=color_char)
+        
+        self.move_ball((oval, text, color_char), x, y)
+        return oval, text, color_char
+    
+    def move_ball(self, ball, x, y):
+        oval, text, _ = ball
+        radius = self.ball_radius
+        self.canvas.coords(oval, x-radius, y-radius, x+radius, y+radius)
+        self.canvas.coords(text, x, y)
+    
+    def fly_balls(self, move, fraction):
+        # Show the balls of move (not yet made in self.grid) fraction of
+        # the way along their path: lifted out of the source tube, slid
+        # over to the target tube and dropped in, at an eased constant speed
+        from_stack, to_stack, ball_count = move
+        first = len(self.grid[from_stack]) - ball_count
+        balls = self.ball_items[from_stack][first:]
+        if self.flying != (from_stack, first):
+            self.land_balls()
+            self.flying = (from_stack, first)
+            for oval, text, _ in balls:
+                self.canvas.tag_raise(oval)
+                self.canvas.tag_raise(text)
+        
+        x0, y0 = self.ball_center(from_stack, first)
+        x1, y1 = self.ball_center(to_stack, len(self.grid[to_stack]))
+        lift_y = self.tube_top - self.ball_radius - 2
+        lift = y0 - lift_y
+        slide = abs(x1 - x0)
+        drop = y1 - lift_y
+        distance = (lift + slide + drop) * fraction * fraction * (3 - 2*fraction)
+        
+        if distance < lift:
+            x, y = x0, y0 - distance
+        elif distance < lift + slide:
+            x, y = x0 + (x1 - x0) * (distance - lift) / slide, lift_y
+        else:
+            x, y = x1, lift_y + distance - lift - slide
+        step = self.ball_radius*2 + 2
+        for k, ball in enumerate(balls):
+            self.move_ball(ball, x, y - k*step)
+    
+    def land_balls(self):
+        # Put balls left in flight by fly_balls back into their tube
+        if self.flying is None:
+            return
+        stack, first = self.flying
+        self.flying = None
+        items = self.ball_items[stack] if stack < len(self.ball_items) else []
+        for j in range(first, len(items)):
+            x, y = self.ball_center(stack, j)
+            self.move_ball(items[j], x, y)
+    
+    def update_selection(self):
+        # Show the selection indicator above the selected stack, if any
+        if self.selected_stack == self.drawn_selection:
+            return
+        self.drawn_selection = self.selected_stack
+        rectangle, text = self.selection_items
+        if self.selected_stack is None or self.selected_stack >= len(self.tube_x):
+            self.canvas.itemconfigure(rectangle, state=tk.HIDDEN)
+            self.canvas.itemconfigure(text, state=tk.HIDDEN)
+            return
+        
+        x1 = self.tube_x[self.selected_stack]
+        x2 = x1 + self.stack_width
+        y1 = self.tube_top
+        self.canvas.coords(rectangle, x1-3, y1-25, x2+3, y1-5)
+        self.canvas.coords(text, x1 + self.stack_width//2, y1-15)
+        self.canvas.itemconfigure(rectangle, state=tk.NORMAL)
+        self.canvas.itemconfigure(text, state=tk.NORMAL)
     
     def draw_ball(self, x, y, radius, color_char):
         # Get the color for this ball
         color = self.colors.get(color_char, "#999999")  # Default gray if color not found
         
         # Draw the ball
-        self.canvas.create_oval(x-radius, y-radius, x+radius, y+radius, 
-                               fill=color, outline="#000000", width=1)
+        oval = self.canvas.create_oval(x-radius, y-radius, x+radius, y+radius, 
+                                       fill=color, outline="#000000", width=1)
         
         # Draw the letter inside the ball
-        self.canvas.create_text(x, y, text=color_char, font=("Arial", int(radius*0.8)))
+        text = self.canvas.create_text(x, y, text=color_char, font=("Arial", int(radius*0.8)))
+        return oval, text, color_char
     
     def on_stack_click(self, event):
-        if self.is_animating:
+        if self.is_animating or self.is_solving():
             return
             
         # Calculate which stack was clicked
@@ -290,7 +507,7 @@ class BallSortPuzzleGUI:
                 break
     
     def try_move(self, from_stack, to_stack):
-        move_count = self.count_movable_balls(self.grid[from_stack], self.grid[to_stack], self.stackHeight)
+        move_count = solver.count_movable_balls(self.grid[from_stack], self.grid[to_stack], self.stackHeight)
         if move_count == 0:
             messagebox.showinfo("Invalid Move", "This move is not allowed!")
             return False
@@ -300,15 +517,22 @@ class BallSortPuzzleGUI:
         self.grid[to_stack] += balls_to_move  # Add the balls
         self.grid[from_stack] = self.grid[from_stack][:-move_count]  # Remove the balls
         
+        # The board left the shown solution; Solve or Hint picks it up again
+        if self.solution_steps:
+            self.solution_steps = []
+            self.current_step = 0
+            self.update_solution_controls()
+        
         # Check if puzzle is solved
-        if self.is_solved(self.grid, self.stackHeight):
+        if solver.is_solved(self.grid, self.stackHeight):
             self.draw_stacks()
             messagebox.showinfo("Congratulations!", "You solved the puzzle!")
         
         return True
     
-    def update_speed(self, value):
-        self.animation_speed = value
+    def update_speed(self, position):
+        # Slider position 0 to 1 maps to MIN_MOVE_MS to MAX_MOVE_MS per move
+        self.animation_speed = MIN_MOVE_MS * (MAX_MOVE_MS / MIN_MOVE_MS) ** position
     
     def change_color(self, color_char):
         current_color = self.colors.get(color_char, "#999999")
@@ -331,6 +555,7 @@ class BallSortPuzzleGUI:
         # Reset solution
         self.solution_steps = []
         self.current_step = 0
+        self.known_solution = None
         self.update_solution_controls()
         
         # Get configuration
@@ -390,44 +615,162 @@ class BallSortPuzzleGUI:
         self.status_label.config(text="Puzzle reset")
     
     def solve_puzzle(self):
-        # Check if grid is valid
-        if not self.check_grid(self.grid):
-            messagebox.showinfo("Invalid Puzzle", "This puzzle configuration is invalid!")
+        if self.is_solving():
+            return
+        
+        # Check for puzzles that cannot be solved before searching
+        reason = solver.find_unsolvable(self.grid, self.stackHeight)
+        if reason is not None:
+            messagebox.showinfo("No Solution", f"This puzzle cannot be solved: {reason}.")
+            self.status_label.config(text="No solution found")
             return
         
-        if self.is_solved(self.grid, self.stackHeight):
+        if solver.is_solved(self.grid, self.stackHeight):
             messagebox.showinfo("Already Solved", "This puzzle is already solved!")
             return
         
+        if self.is_animating:
+            self.pause_solution()
+        
+        # Reuse the last solution if the board is on it, or for the faster
+        # modes a few moves off it (see SolutionPath.resume_solve)
+        mode = self.search_modes[self.search_mode_var.get()]
+        if self.known_solution is not None:
+            solution = self.known_solution.resume_solve(self.grid, self.stackHeight, mode)
+            if solution is not None:
+                if mode not in solver.OPTIMAL_MODES:
+                    solution = solver.optimize_path(self.grid, self.stackHeight, solution)
+                self.set_solution(solution, self.grid, mode)
+                return
+        
         self.status_label.config(text="Solving puzzle...")
-        self.root.update()
         
         # Reset solution
         self.solution_steps = []
-        answer_mod = []
-        visited = set()
+        self.current_step = 0
+        self.update_solution_controls()
         
         # Make a copy of the grid for solving
         grid_copy = deepcopy(self.grid)
+        self.solver_grid = grid_copy
+        self.solver_mode = mode
+        
+        # Solve in a worker thread so the window stays responsive
+        self.solver_cancel.clear()
+        self.solver_progress = None
+        self.solver_result = None
+        self.solver_thread = threading.Thread(target=self.run_solver, daemon=True,
+                                              args=(grid_copy, self.stackHeight, mode))
+        self.set_solving_controls(True)
+        self.solver_thread.start()
+        self.root.after(100, self.poll_solver)
+    
+    def run_solver(self, grid, stack_height, mode):
+        # Runs on the worker thread: no Tk calls here, results are handed
+        # back through attributes that poll_solver reads on the main thread
+        def report(nodes, frontier, elapsed):
+            self.solver_progress = (nodes, frontier, elapsed)
+        
+        monitor = solver.SearchMonitor(progress=report, cancel=self.solver_cancel)
+        # IDA* keeps only its path in memory, a small cache saves most repeats
+        table = solver.TranspositionTable(16) if mode == "ida" else None
+        try:
+            if self.solution_cache is not None:
+                solution = solver.solve_cached(self.solution_cache, grid, stack_height, mode,
+                                               monitor, table=table)
+            else:
+                solution = solver.solve(grid, stack_height, mode, monitor, table=table)
+            # The optimal modes are already shortest, the others leave detours
+            if solution is not None and mode not in solver.OPTIMAL_MODES:
+                solution = solver.optimize_path(grid, stack_height, solution)
+        except solver.SearchAborted:
+            solution = None
+        self.solver_result = (solution,)
+    
+    def poll_solver(self):
+        if self.solver_thread.is_alive():
+            if self.solver_progress is not None:
+                nodes, frontier, elapsed = self.solver_progress
+                self.status_label.config(text=f"Solving puzzle... {nodes:,} nodes expanded, "
+                                              f"frontier {frontier:,}, {elapsed:.1f}s")
+            self.root.after(100, self.poll_solver)
+            return
         
-        # Solve the puzzle
-        if self.solve_puzzle_algorithm(grid_copy, self.stackHeight, visited, answer_mod):
-            # Process solution
-            answer_mod.reverse()
-            self.solution_steps = answer_mod
-            self.current_step = 0
-            
-            # Update controls
-            self.update_solution_controls()
-            self.status_label.config(text=f"Solution found! {len(self.solution_steps)} moves")
-            
-            # Enable solution controls
-            self.play_btn.config(state=tk.NORMAL)
-            self.next_btn.config(state=tk.NORMAL)
+        self.solver_thread = None
+        self.set_solving_controls(False)
+        solution = self.solver_result[0] if self.solver_result else None
+        
+        if self.solver_cancel.is_set():
+            self.hint_requested = False
+            self.status_label.config(text="Solving cancelled")
+        elif solution is not None:
+            self.set_solution(solution, self.solver_grid, self.solver_mode)
         else:
+            self.hint_requested = False
             messagebox.showinfo("No Solution", "Could not find a solution for this puzzle!")
             self.status_label.config(text="No solution found")
     
+    def set_solution(self, solution, start_grid, mode):
+        # Show a solution of start_grid (the current board), found in the
+        # given search mode, in the solution controls and remember it for
+        # later solves and hints
+        self.solution_steps = solution
+        self.current_step = 0
+        self.solution_start = deepcopy(start_grid)
+        self.known_solution = solver.SolutionPath(start_grid, self.stackHeight, solution,
+                                                  mode in solver.OPTIMAL_MODES)
+        
+        # Update controls
+        self.update_solution_controls()
+        self.status_label.config(text=f"Solution found! {len(self.solution_steps)} moves")
+        
+        if self.hint_requested:
+            self.hint_requested = False
+            self.show_hint_move(solution[0])
+    
+    def show_hint(self):
+        if self.is_animating or self.is_solving():
+            return
+        if solver.is_solved(self.grid, self.stackHeight):
+            self.status_label.config(text="The puzzle is already solved")
+            return
+        
+        solution = None
+        if self.known_solution is not None:
+            solution = self.known_solution.resume(self.grid, self.stackHeight)
+        if solution is None:
+            # Nothing to build on yet: solve from here, then show the hint
+            self.hint_requested = True
+            self.solve_puzzle()
+            if not self.is_solving():
+                self.hint_requested = False
+            return
+        self.show_hint_move(solution[0])
+    
+    def show_hint_move(self, move):
+        # Select the source tube so one click on the target plays the move
+        from_stack, to_stack, ball_count = move
+        self.selected_stack = from_stack
+        self.draw_stacks()
+        self.status_label.config(text=f"Hint: move {ball_count} ball(s) from stack {from_stack+1} "
+                                      f"to stack {to_stack+1}")
+    
+    def cancel_solve(self):
+        if self.is_solving():
+            self.solver_cancel.set()
+            self.status_label.config(text="Cancelling...")
+    
+    def is_solving(self):
+        return self.solver_thread is not None
+    
+    def set_solving_controls(self, solving):
+        # The board must not change under a running search
+        state = tk.DISABLED if solving else tk.NORMAL
+        for btn in (self.new_puzzle_btn, self.create_puzzle_btn, self.reset_btn, self.solve_btn,
+                    self.hint_btn):
+            btn.config(state=state)
+        self.cancel_btn.config(state=tk.NORMAL if solving else tk.DISABLED)
+    
     def play_solution(self):
         if not self.solution_steps:
             return
@@ -437,40 +780,63 @@ class BallSortPuzzleGUI:
         self.pause_btn.config(state=tk.NORMAL)
         
         # Start animation
+        self.move_progress = 0.0
+        self.last_frame = time.perf_counter()
         self.animate_solution()
     
     def animate_solution(self):
+        # One animation frame. Playback advances by the time since the last
+        # frame, so a move takes animation_speed ms however long frames take
+        # to draw. Every move finished since the last frame is made at once,
+        # without drawing the ones between: below 1000 / ANIMATION_FPS ms
+        # per move that is several moves each frame, and a slow frame skips
+        # further ahead.
         if not self.is_animating or self.current_step >= len(self.solution_steps):
-            self.is_animating = False
-            self.pause_btn.config(state=tk.DISABLED)
+            self.stop_animation()
             return
-            
-        # Get current move
-        move = self.solution_steps[self.current_step]
-        from_stack, to_stack, ball_count = move
-        
-        # Display move
-        self.status_label.config(text=f"Moving {ball_count} ball(s) from stack {from_stack+1} to stack {to_stack+1}")
         
-        # Perform the move
-        balls_to_move = self.grid[from_stack][-ball_count:]
-        self.grid[to_stack] += balls_to_move
-        self.grid[from_stack] = self.grid[from_stack][:-ball_count]
+        self.animation_job = None
+        frame_start = time.perf_counter()
+        self.move_progress += (frame_start - self.last_frame) * 1000 / self.animation_speed
+        self.last_frame = frame_start
+        
+        finished = min(int(self.move_progress), len(self.solution_steps) - self.current_step)
+        if finished:
+            for from_stack, to_stack, ball_count in \
+                    self.solution_steps[self.current_step:self.current_step + finished]:
+                balls_to_move = self.grid[from_stack][-ball_count:]
+                self.grid[to_stack] += balls_to_move
+                self.grid[from_stack] = self.grid[from_stack][:-ball_count]
+            self.current_step += finished
+            self.move_progress -= finished
+            
+            # Display the last move made
+            from_stack, to_stack, ball_count = self.solution_steps[self.current_step - 1]
+            self.status_label.config(text=f"Moving {ball_count} ball(s) from stack {from_stack+1} to stack {to_stack+1}")
+            self.draw_stacks()
+            self.update_solution_controls()
         
-        # Update display
-        self.draw_stacks()
-        self.current_step += 1
-        self.step_counter.config(text=f"Step: {self.current_step}/{len(self.solution_steps)}")
+        if self.current_step >= len(self.solution_steps):
+            self.stop_animation()
+            return
+        self.fly_balls(self.solution_steps[self.current_step], self.move_progress)
         
-        # Update button states
+        # Schedule the next frame, less the time this one took
+        spent = int((time.perf_counter() - frame_start) * 1000)
+        self.animation_job = self.root.after(max(1, 1000 // ANIMATION_FPS - spent),
+                                             self.animate_solution)
+    
+    def stop_animation(self):
+        self.is_animating = False
+        self.land_balls()
         self.update_solution_controls()
-        
-        # Schedule next animation step
-        if self.is_animating and self.current_step < len(self.solution_steps):
-            self.root.after(int(self.animation_speed), self.animate_solution)
     
     def pause_solution(self):
         self.is_animating = False
+        if self.animation_job is not None:
+            self.root.after_cancel(self.animation_job)
+            self.animation_job = None
+        self.land_balls()
         self.play_btn.config(state=tk.NORMAL)
         self.pause_btn.config(state=tk.DISABLED)
     
@@ -502,8 +868,8 @@ class BallSortPuzzleGUI:
         if not self.solution_steps or self.current_step <= 0:
             return
             
-        # Reset to beginning and replay until the previous step
-        self.initialize_grid()
+        # Reset to where the solution started and replay until the previous step
+        self.grid = deepcopy(self.solution_start)
         original_step = self.current_step - 1
         self.current_step = 0
         
@@ -762,6 +1128,14 @@ class BallSortPuzzleGUI:
                            command=lambda: load_current_puzzle())
         load_btn.pack(side=tk.LEFT, padx=5)
         
+        open_file_btn = tk.Button(bottom_frame, text="Open File...", 
+                                command=lambda: open_puzzle_file())
+        open_file_btn.pack(side=tk.LEFT, padx=5)
+        
+        save_file_btn = tk.Button(bottom_frame, text="Save to File...", 
+                                command=lambda: save_puzzle_file())
+        save_file_btn.pack(side=tk.LEFT, padx=5)
+        
         save_btn = tk.Button(bottom_frame, text="Save & Use This Puzzle", 
                            command=lambda: save_puzzle())
         save_btn.pack(side=tk.RIGHT, padx=5)
@@ -797,7 +1171,7 @@ class BallSortPuzzleGUI:
             
             if valid:
                 # Check if puzzle is already solved
-                if self.is_solved(creator_grid, stack_height):
+                if solver.is_solved(creator_grid, stack_height):
                     messagebox.showinfo("Validation", "Puzzle is valid but already solved!")
                 else:
                     messagebox.showinfo("Validation", "Puzzle is valid!")
@@ -814,6 +1188,64 @@ class BallSortPuzzleGUI:
             creator_height_var.set(self.stackHeight)
             draw_creator_grid()
         
+        # Puzzle files: text (one puzzle per line) or the binary .bsp format
+        file_types = [("Puzzle files", "*.txt *.bsp"), ("All files", "*.*")]
+        
+        # Function to load the first puzzle of a file
+        def open_puzzle_file():
+            nonlocal creator_grid
+            path = filedialog.askopenfilename(parent=creator_window, filetypes=file_types)
+            if not path:
+                return
+            try:
+                if ball_sort_format.is_puzzle_file(path):
+                    with ball_sort_format.PuzzleReader(path) as reader:
+                        grid = next(iter(reader), (None, None))[0]
+                        stack_height = reader.stack_height
+                else:
+                    with open(path) as stream:
+                        grid = next(solver.read_puzzles(stream), None)
+                    stack_height = solver.infer_stack_height(grid) if grid else 0
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Open File", str(error), parent=creator_window)
+                return
+            if not grid:
+                messagebox.showerror("Open File", "The file holds no puzzle.", parent=creator_window)
+                return
+            
+            unknown = set(''.join(grid)) - set(self.colors)
+            if unknown:
+                messagebox.showerror("Open File", f"Unknown colors: {', '.join(sorted(unknown))}",
+                                     parent=creator_window)
+                return
+            creator_grid = list(grid)
+            creator_stack_var.set(len(grid))
+            creator_height_var.set(stack_height)
+            draw_creator_grid()
+        
+        # Function to write the puzzle to a file
+        def save_puzzle_file():
+            if not any(creator_grid):
+                messagebox.showerror("Save to File", "Puzzle is empty! Add some balls.",
+                                     parent=creator_window)
+                return
+            path = filedialog.asksaveasfilename(parent=creator_window, filetypes=file_types,
+                                                defaultextension=".txt")
+            if not path:
+                return
+            try:
+                if path.endswith(".bsp"):
+                    colors = ''.join(color for color in self.colors
+                                     if color in ''.join(creator_grid))
+                    with ball_sort_format.PuzzleWriter(path, len(creator_grid),
+                                                       creator_height_var.get(), colors) as writer:
+                        writer.write(creator_grid)
+                else:
+                    with open(path, "w") as stream:
+                        stream.write(solver.format_puzzle(creator_grid) + "\n")
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Save to File", str(error), parent=creator_window)
+        
         # Function to save the puzzle and use it
         def save_puzzle():
             if validate_puzzle():
@@ -826,6 +1258,7 @@ class BallSortPuzzleGUI:
                 # Reset solution
                 self.solution_steps = []
                 self.current_step = 0
+                self.known_solution = None
                 self.update_solution_controls()
                 
                 # Update the main grid
@@ -865,7 +1298,8 @@ class BallSortPuzzleGUI:
         - Click 'New Random Puzzle' to generate a new puzzle.
         - Click 'Create Custom Puzzle' to design your own puzzle.
         - Click 'Reset Current Puzzle' to start over.
-        - Click 'Solve Puzzle' to find and animate a solution.
+        - Click 'Solve Puzzle' to find and animate a solution from the current position.
+        - Click 'Hint' to highlight the next move (it selects the tube to move from).
         - Use the solution controls to step through or animate the solution.
         
         Customize:
@@ -888,130 +1322,7 @@ class BallSortPuzzleGUI:
         
         close_btn = tk.Button(help_window, text="Close", command=help_window.destroy)
         close_btn.pack(pady=10)
-    
-    # Algorithm helper methods
-    def is_solved(self, grid, stack_height):
-        for stack in grid:
-            # Empty stacks are ok
-            if not stack:
-                continue
-                
-            # If stack is not full, it's not solved
-            if len(stack) != stack_height:
-                return False
-                
-            # If not all balls are the same color, it's not solved
-            first_color = stack[0]
-            if any(ball != first_color for ball in stack):
-                return False
-        
-        return True
-    
-    def check_grid(self, grid):
-        # Count balls of each color
-        color_counts = {}
-        
-        for stack in grid:
-            for ball in stack:
-                color_counts[ball] = color_counts.get(ball, 0) + 1
-        
-        # Check that each color has exactly stack_height balls
-        stack_height = self.stackHeight
-        for color, count in color_counts.items():
-            if count != stack_height:
-                return False
-        
-        return True
-    
-    def count_movable_balls(self, from_stack, to_stack, stack_height):
-        # If source stack is empty, no balls can be moved
-        if not from_stack:
-            return 0
-            
-        # Get the top ball from source
-        top_ball = from_stack[-1]
-        
-        # Count how many identical balls are at the top
-        count = 0
-        for i in range(len(from_stack)-1, -1, -1):
-            if from_stack[i] == top_ball:
-                count += 1
-            else:
-                break
-        
-        # If destination is empty, all identical balls can be moved
-        if not to_stack:
-            return count
-            
-        # If destination's top ball is different, no balls can be moved
-        if to_stack[-1] != top_ball:
-            return 0
-            
-        # If moving would exceed stack height, limit the count
-        if len(to_stack) + count > stack_height:
-            return stack_height - len(to_stack)
-            
-        return count
-    
-    
-    def get_valid_moves(self, grid, stack_height):
-        moves = []
-        num_stacks = len(grid)
-
-        for i in range(num_stacks):
-            from_stack = grid[i]
-            if not from_stack:
-                continue
-
-            top_ball = from_stack[-1]
-            for j in range(num_stacks):
-                if i == j:
-                    continue
-                to_stack = grid[j]
-
-                # Prevent no-gain shuffling into empty tubes
-                if not to_stack:
-                    if len(set(from_stack)) == 1 and len(from_stack) == stack_height:
-                        continue
-                    if from_stack.count(top_ball) == 1:
-                        continue
-
-                # Skip if destination not compatible
-                if to_stack and (to_stack[-1] != top_ball or len(to_stack) >= stack_height):
-                    continue
-
-                # Use count_movable_balls logic to determine move count
-                move_count = self.count_movable_balls(from_stack, to_stack, stack_height)
-                if move_count > 0:
-                    moves.append((i, j, move_count))
-
-        return moves
-
-
-
-    def solve_puzzle_algorithm(self, grid, stack_height, visited, answer_mod):
-        grid_str = '|'.join(''.join(stack) for stack in grid)
-        if grid_str in visited:
-            return False
-        visited.add(grid_str)
-
-        if self.is_solved(grid, stack_height):
-            return True
-
-        for from_idx, to_idx, move_count in self.get_valid_moves(grid, stack_height):
-            balls_to_move = grid[from_idx][-move_count:]
-            grid[to_idx] += balls_to_move
-            grid[from_idx] = grid[from_idx][:-move_count]
-
-            if self.solve_puzzle_algorithm(grid, stack_height, visited, answer_mod):
-                answer_mod.append((from_idx, to_idx, move_count))
-                return True
-
-            # Undo
-            grid[from_idx] += balls_to_move
-            grid[to_idx] = grid[to_idx][:-move_count]
 
-        return False
 def main():
     root = tk.Tk()
     app = BallSortPuzzleGUI(root)
@@ -0,0 +1,255 @@
+"""Batch solving of Ball Sort puzzle files across a process pool.
+
+Reads puzzles in the ball_sort_solver text format (one per line), or a
+binary ball_sort_format file, and solves them on all cores. Results are
+written as one JSON object per puzzle as soon as each puzzle finishes, so
+they arrive in completion order; "index" is the puzzle's position in the
+input.
+
+    python ball_sort_batch.py levels.txt --jobs 8 --max-nodes 200000 --time-limit 5
+
+With --portfolio each puzzle is instead raced by several search
+configurations in parallel processes, taking the first answer (or the
+shortest one found before --deadline with --best).
+"""
+import argparse
+import json
+import multiprocessing
+import multiprocessing.util
+import queue
+import sys
+import time
+
+import ball_sort_cache
+import ball_sort_format
+import ball_sort_solver as solver
+
+# The worker process's SolutionCache, opened once by open_worker_cache
+_worker_cache = None
+
+
+def open_worker_cache(cache_path):
+    # Pool initializer: one cache connection per worker process, closed
+    # when the worker exits after the pool is closed
+    global _worker_cache
+    if cache_path is not None:
+        _worker_cache = ball_sort_cache.SolutionCache(cache_path)
+        multiprocessing.util.Finalize(_worker_cache, _worker_cache.close, exitpriority=10)
+
+
+def solve_one(task):
+    # Worker side: solve one puzzle within its node and time budgets
+    index, grid, stack_height, mode, max_nodes, time_limit = task
+    monitor = solver.SearchMonitor(max_nodes=max_nodes, time_limit=time_limit)
+    moves = None
+
+    reason = solver.find_unsolvable(grid, stack_height)
+    if reason is not None:
+        status = "no solution"
+    else:
+        try:
+            if _worker_cache is None:
+                moves = solver.solve(grid, stack_height, mode, monitor)
+            else:
+                moves = solver.solve_cached(_worker_cache, grid, stack_height, mode, monitor)
+            status = "solved" if moves is not None else "no solution"
+        except solver.SearchAborted as aborted:
+            status = aborted.reason
+
+    return {
+        "index": index,
+        "puzzle": grid,
+        "height": stack_height,
+        "status": status,
+        "reason": reason,
+        "moves": moves,
+        "nodes": monitor.expanded,
+        "seconds": round(monitor.elapsed(), 4),
+    }
+
+
+def solve_batch(puzzles, stack_height=None, mode="astar", max_nodes=None, time_limit=None,
+                jobs=None, chunksize=1, cache_path=None):
+    # Solve an iterable of (grid, height) pairs on a pool of jobs processes
+    # (default: all cores), yielding result dicts in completion order. The
+    # height is stack_height if given, else the pair's, else inferred from
+    # the grid. With cache_path the workers share an SQLite solution cache.
+    tasks = ((index, grid, stack_height or height or solver.infer_stack_height(grid), mode,
+              max_nodes, time_limit)
+             for index, (grid, height) in enumerate(puzzles))
+
+    with multiprocessing.Pool(jobs, open_worker_cache, (cache_path,)) as pool:
+        yield from pool.imap_unordered(solve_one, tasks, chunksize)
+        # Let the workers exit on their own so they close their caches
+        pool.close()
+        pool.join()
+
+
+# Configurations raced by solve_portfolio. Depth-first in the default order
+# is sometimes instant and sometimes hopeless, best-first has the opposite
+# profile, and the seeded variants decorrelate the runs further.
+DEFAULT_PORTFOLIO = (
+    {"name": "dfs", "mode": "dfs"},
+    {"name": "greedy", "mode": "greedy"},
+    {"name": "weighted", "mode": "weighted"},
+    {"name": "astar", "mode": "astar"},
+    {"name": "dfs-shuffled", "mode": "dfs", "seed": 1},
+    {"name": "greedy-shuffled", "mode": "greedy", "seed": 2},
+)
+
+
+def run_config(config, grid, stack_height, cancel, results):
+    # Portfolio process: run one configuration until it finishes or the
+    # shared cancel event is set
+    monitor = solver.SearchMonitor(cancel=cancel)
+    moves = None
+    try:
+        moves = solver.solve(grid, stack_height, config["mode"], monitor, config.get("seed"))
+        status = "solved" if moves is not None else "no solution"
+    except solver.SearchAborted as aborted:
+        status = aborted.reason
+
+    results.put({
+        "config": config["name"],
+        "status": status,
+        "moves": moves,
+        "nodes": monitor.expanded,
+        "seconds": round(monitor.elapsed(), 4),
+    })
+
+
+def solve_portfolio(grid, stack_height, configs=DEFAULT_PORTFOLIO, deadline=None, best=False):
+    # Race configs (dicts with "name", "mode" and an optional "seed") in
+    # parallel processes. Returns the first solution's result dict, or with
+    # best=True the shortest one found before the deadline (seconds). The
+    # result is None if nothing was found in time; its status is
+    # "no solution" if a search proved the puzzle unsolvable. The remaining
+    # searches are cancelled as soon as the answer is known.
+    by_name = {config["name"]: config for config in configs}
+    cancel = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_config, daemon=True,
+                                         args=(config, grid, stack_height, cancel, results))
+                 for config in configs]
+    for process in processes:
+        process.start()
+
+    stop_at = None if deadline is None else time.time() + deadline
+    answer = None
+    pending = len(processes)
+    try:
+        while pending:
+            timeout = None if stop_at is None else max(0.0, stop_at - time.time())
+            try:
+                result = results.get(timeout=timeout)
+            except queue.Empty:
+                break  # Deadline reached
+            pending -= 1
+
+            if result["status"] == "no solution":
+                # Every mode is exhaustive, so one failure proves it for all
+                answer = result
+                break
+            if result["moves"] is None:
+                continue
+            if answer is None or len(result["moves"]) < len(answer["moves"]):
+                answer = result
+            # Nothing can beat the answer of an optimal mode
+            if not best or by_name[result["config"]]["mode"] in solver.OPTIMAL_MODES:
+                break
+    finally:
+        cancel.set()
+        stop_processes(processes, results)
+
+    return answer
+
+
+def stop_processes(processes, results, grace=2.0):
+    # Wait for cancelled searches to notice the event, draining their
+    # results so no process blocks on a full queue, then kill stragglers
+    give_up_at = time.time() + grace
+    while any(process.is_alive() for process in processes) and time.time() < give_up_at:
+        try:
+            results.get(timeout=0.05)
+        except queue.Empty:
+            pass
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def race_puzzles(puzzles, stack_height=None, deadline=None, best=False):
+    # Portfolio-solve (grid, height) pairs one after another as in
+    # solve_batch, yielding result dicts
+    for index, (grid, height) in enumerate(puzzles):
+        height = stack_height or height or solver.infer_stack_height(grid)
+        result = {"index": index, "puzzle": grid, "height": height}
+        reason = solver.find_unsolvable(grid, height)
+        if reason is not None:
+            result.update(status="no solution", reason=reason, moves=None)
+        else:
+            answer = solve_portfolio(grid, height, deadline=deadline, best=best)
+            result.update(answer or {"status": "time limit", "moves": None})
+        yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a file of Ball Sort puzzles on all cores.")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="puzzle file, one puzzle per line or in the binary format "
+                             "(default: stdin)")
+    parser.add_argument("--height", type=int,
+                        help="tube height (default: number of balls per color)")
+    parser.add_argument("--mode", choices=solver.MODES, default="astar",
+                        help="search mode (default: astar)")
+    parser.add_argument("--jobs", type=int,
+                        help="worker processes (default: number of cores)")
+    parser.add_argument("--max-nodes", type=int,
+                        help="give up on a puzzle after expanding this many nodes")
+    parser.add_argument("--time-limit", type=float,
+                        help="give up on a puzzle after this many seconds")
+    parser.add_argument("--chunksize", type=int, default=1,
+                        help="puzzles handed to a worker at a time (default: 1)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="reuse and store solutions in this SQLite solution cache")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="race several search configurations on each puzzle instead")
+    parser.add_argument("--deadline", type=float,
+                        help="portfolio: seconds to wait for an answer per puzzle")
+    parser.add_argument("--best", action="store_true",
+                        help="portfolio: keep the shortest answer found before the deadline")
+    args = parser.parse_args(argv)
+
+    binary = args.file != "-" and ball_sort_format.is_puzzle_file(args.file)
+    stream = sys.stdin if args.file == "-" or binary else open(args.file)
+    started = time.time()
+    counts = {}
+    try:
+        if binary:
+            puzzles = ball_sort_format.iter_puzzles(args.file)
+        else:
+            puzzles = ((grid, None) for grid in solver.read_puzzles(stream))
+        if args.portfolio:
+            results = race_puzzles(puzzles, args.height, args.deadline, args.best)
+        else:
+            results = solve_batch(puzzles, args.height, args.mode, args.max_nodes,
+                                  args.time_limit, args.jobs, args.chunksize, args.cache)
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            print(json.dumps(result), flush=True)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    # Summary on stderr so stdout stays one JSON object per line
+    total = sum(counts.values())
+    elapsed = time.time() - started
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"{total} puzzles in {elapsed:.2f}s ({summary})", file=sys.stderr)
+
+    return 0 if counts.get("solved", 0) == total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
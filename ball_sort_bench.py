@@ -0,0 +1,263 @@
+"""Reproducible benchmark of the Ball Sort solver.
+
+Solves a fixed corpus with every search mode and records the wall time,
+expanded nodes and solution length of each run. The corpus is made of
+seeded random puzzles of the board sizes the GUI's "New Random Puzzle"
+produces, plus a few known hard levels. Results are written as JSON.
+Comparing a run against a stored baseline flags every mode whose time,
+nodes or solution length grew by more than a threshold:
+
+    python ball_sort_bench.py --out baseline.json
+    python ball_sort_bench.py --baseline baseline.json --threshold 10
+
+Wall times are only comparable between runs on the same machine. The node
+counts and lengths are deterministic and can be compared anywhere.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import ball_sort_format
+import ball_sort_solver as solver
+
+# Random part of the corpus: PUZZLES_PER_SIZE puzzles of each size, as
+# (tubes, height) with two empty tubes and up to the GUI's 8 colors. Each
+# size draws from its own seed, so changing the sizes keeps the others.
+CORPUS_SEED = 20250301
+CORPUS_SIZES = ((5, 3), (6, 4), (7, 5), (8, 4), (10, 4), (10, 6), (10, 8))
+PUZZLES_PER_SIZE = 3
+
+# The GUI's starting puzzle, and the boards that took A* the most nodes
+# among several thousand random ones of their size
+HARD_LEVELS = (
+    ("gui-start", "gbbb ybry yggy rrrg - -"),
+    ("hard-7x5", "ppygy pgpgb rbyrb yrbyr gprgb - -"),
+    ("hard-10x4", "ymyr gmgp bmpy cycg cmpo rprg bbco obor - -"),
+    ("hard-10x6", "roogrb mmmbyg pyrcbc pygrcr bgoomp pgmbcg cyopyp oymbcr - -"),
+    ("hard-10x8", "ybyyprmb omrygypy mbgcopgp mbccrorg mgoopbcg rrrobcgo mbcmborc mppycpyg - -"),
+    ("hard-10x8b", "rbopobrm pgyrccmb ropbcmog gyooymby prrygcbr popprgcc mgmmpmoy gbgccyby - -"),
+)
+
+# Measures compared against a baseline; for each of them more is worse
+MEASURES = ("seconds", "nodes", "length")
+DEFAULT_THRESHOLD = 10.0
+
+# Time totals shorter than this are mostly timer noise and never regress
+MIN_COMPARED_SECONDS = 0.1
+
+
+def build_corpus(seed=CORPUS_SEED, sizes=CORPUS_SIZES, per_size=PUZZLES_PER_SIZE):
+    # [(name, grid, stack_height)] of the random puzzles, then HARD_LEVELS
+    corpus = []
+    for tubes, height in sizes:
+        rng = random.Random(f"{seed}:{tubes}x{height}")
+        for k in range(per_size):
+            corpus.append((f"{tubes}x{height}-{k}", solver.random_puzzle(tubes, height, rng), height))
+    for name, line in HARD_LEVELS:
+        grid = solver.parse_puzzle(line)
+        corpus.append((name, grid, solver.infer_stack_height(grid)))
+    return corpus
+
+
+def read_corpus(path):
+    # Corpus from a puzzle file, in the ball_sort_solver text format or
+    # the binary ball_sort_format
+    if ball_sort_format.is_puzzle_file(path):
+        puzzles = list(ball_sort_format.iter_puzzles(path))
+    else:
+        with open(path) as stream:
+            puzzles = [(grid, solver.infer_stack_height(grid))
+                       for grid in solver.read_puzzles(stream)]
+    return [(f"line-{index + 1}", grid, stack_height)
+            for index, (grid, stack_height) in enumerate(puzzles)]
+
+
+def run_benchmark(corpus, modes=solver.MODES, max_nodes=None, time_limit=None, repeat=1,
+                  progress=None):
+    # Solve every puzzle with every mode, returning one result dict per
+    # run. With repeat > 1 each run is repeated and the fastest time kept.
+    # Solutions are replayed, and a wrong one is reported as "invalid".
+    # progress(result) is called after every run.
+    results = []
+    for name, grid, height in corpus:
+        for mode in modes:
+            seconds = None
+            for _ in range(repeat):
+                monitor = solver.SearchMonitor(max_nodes=max_nodes, time_limit=time_limit)
+                started = time.perf_counter()
+                try:
+                    moves = solver.solve(grid, height, mode, monitor)
+                    status = "solved" if moves is not None else "no solution"
+                except solver.SearchAborted as aborted:
+                    moves = None
+                    status = aborted.reason
+                elapsed = time.perf_counter() - started
+                seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+            if moves is not None and not solver.is_solved(solver.apply_moves(grid, moves), height):
+                status = "invalid"
+            result = {
+                "puzzle": name,
+                "grid": solver.format_puzzle(grid),
+                "height": height,
+                "mode": mode,
+                "status": status,
+                "seconds": round(seconds, 5),
+                "nodes": monitor.expanded,
+                "length": len(moves) if moves is not None else None,
+            }
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def summarize(results):
+    # {mode: totals} over every run of the mode; seconds and nodes count
+    # all runs, length only the solved ones
+    summary = {}
+    for result in results:
+        totals = summary.setdefault(result["mode"], {"runs": 0, "solved": 0, "seconds": 0.0,
+                                                     "nodes": 0, "length": 0})
+        totals["runs"] += 1
+        totals["seconds"] = round(totals["seconds"] + result["seconds"], 5)
+        totals["nodes"] += result["nodes"]
+        if result["status"] == "solved":
+            totals["solved"] += 1
+            totals["length"] += result["length"]
+    return summary
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Compare two result lists run by run. Returns ({mode: {measure:
+    # (baseline total, new total, change in percent)}}, regressions), where
+    # the totals cover the runs solved in both, and regressions lists a
+    # message for every total that grew by more than threshold percent and
+    # every run that was solved in the baseline but is not any more.
+    before = {(result["grid"], result["height"], result["mode"]): result for result in baseline}
+    totals = {}
+    regressions = []
+    for result in results:
+        old = before.get((result["grid"], result["height"], result["mode"]))
+        if old is None or old["status"] != "solved":
+            continue
+        if result["status"] != "solved":
+            regressions.append(f"{result['mode']} {result['puzzle']}: {result['status']} "
+                               f"(was solved in {old['seconds']}s)")
+            continue
+        sums = totals.setdefault(result["mode"], {measure: [0, 0] for measure in MEASURES})
+        for measure in MEASURES:
+            sums[measure][0] += old[measure]
+            sums[measure][1] += result[measure]
+
+    changes = {}
+    for mode, sums in totals.items():
+        changes[mode] = {}
+        for measure, (old_total, new_total) in sums.items():
+            change = 100.0 * (new_total - old_total) / old_total if old_total else 0.0
+            changes[mode][measure] = (old_total, new_total, change)
+            if measure == "seconds" and max(old_total, new_total) < MIN_COMPARED_SECONDS:
+                continue
+            if change > threshold:
+                regressions.append(f"{mode} {measure}: {old_total:.6g} -> {new_total:.6g} "
+                                   f"(+{change:.1f}%)")
+    return changes, regressions
+
+
+def print_summary(summary, changes=None, stream=sys.stdout):
+    # Table of the per-mode totals, with the change against the baseline
+    # after each measure when there is one
+    for mode, totals in summary.items():
+        line = (f"{mode:<9} solved {totals['solved']:>3}/{totals['runs']:<3} "
+                f"{totals['seconds']:>9.3f}s {totals['nodes']:>10} nodes "
+                f"{totals['length']:>6} moves")
+        if changes is not None and mode in changes:
+            line += "   vs baseline: " + ", ".join(
+                f"{measure} {change:+.1f}%" for measure, (_, _, change) in changes[mode].items())
+        print(line, file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Ball Sort solver.")
+    parser.add_argument("--modes", default=",".join(solver.MODES),
+                        help="comma-separated search modes (default: all)")
+    parser.add_argument("--corpus", metavar="FILE",
+                        help="benchmark the puzzles in FILE instead of the built-in corpus")
+    parser.add_argument("--seed", type=int, default=CORPUS_SEED,
+                        help=f"seed of the random puzzles (default: {CORPUS_SEED})")
+    parser.add_argument("--per-size", type=int, default=PUZZLES_PER_SIZE,
+                        help=f"random puzzles per board size (default: {PUZZLES_PER_SIZE})")
+    parser.add_argument("--max-nodes", type=int, default=200000,
+                        help="give up on a run after this many nodes (default: 200000)")
+    parser.add_argument("--time-limit", type=float, default=10.0,
+                        help="give up on a run after this many seconds (default: 10)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="repeat each run and keep the fastest time (default: 1)")
+    parser.add_argument("--out", metavar="FILE",
+                        help="write the results as JSON to FILE")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare against the results in FILE and fail on regressions")
+    parser.add_argument("--results", metavar="FILE",
+                        help="with --baseline, compare these stored results instead of running")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="percent increase that counts as a regression "
+                             f"(default: {DEFAULT_THRESHOLD:g})")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in solver.MODES]
+    if unknown:
+        parser.error(f"unknown search mode(s) {', '.join(unknown)}")
+
+    if args.results is not None:
+        with open(args.results) as stream:
+            report = json.load(stream)
+    else:
+        if args.corpus is not None:
+            corpus = read_corpus(args.corpus)
+        else:
+            corpus = build_corpus(args.seed, per_size=args.per_size)
+
+        def progress(result):
+            print(f"{result['puzzle']:<12} {result['mode']:<9} {result['status']:<12} "
+                  f"{result['seconds']:>8.3f}s {result['nodes']:>8} nodes", file=sys.stderr)
+
+        results = run_benchmark(corpus, modes, args.max_nodes, args.time_limit, args.repeat,
+                                progress)
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "settings": {"modes": modes, "corpus": args.corpus, "seed": args.seed,
+                         "per_size": args.per_size, "max_nodes": args.max_nodes,
+                         "time_limit": args.time_limit, "repeat": args.repeat},
+            "summary": summarize(results),
+            "results": results,
+        }
+        if args.out is not None:
+            with open(args.out, "w") as stream:
+                json.dump(report, stream, indent=1)
+
+    changes = regressions = None
+    if args.baseline is not None:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+        changes, regressions = compare(report["results"], baseline["results"], args.threshold)
+
+    print_summary(report["summary"], changes)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    invalid = [result for result in report["results"] if result["status"] == "invalid"]
+    for result in invalid:
+        print(f"invalid solution: {result['mode']} {result['puzzle']}")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Persistent solution cache for the Ball Sort solver.
+
+Solutions are stored in an SQLite file, keyed by a canonical form of the
+puzzle that ignores tube order and color names, so the same level with
+its tubes shuffled or recolored is a hit too. Each entry keeps the moves
+(None for a puzzle proven unsolvable), their number and whether they are
+known to be shortest. The least recently used entries are evicted once
+the cache holds max_entries puzzles.
+
+    cache = SolutionCache("solutions.sqlite")
+    moves = ball_sort_solver.solve_cached(cache, grid, 4, mode="greedy")
+"""
+import json
+import sqlite3
+import time
+
+
+def canonical_puzzle(grid, stack_height):
+    # (key, order): key is the same for puzzles that differ only in tube
+    # order and color names, and order[c] is the index in grid of the c-th
+    # tube of the canonical form. Colors are renamed by first appearance,
+    # reading tubes sorted by their color-blind shape; equally shaped tubes
+    # can still leave two names for one puzzle, which only costs a miss.
+    def shape(tube):
+        names = {}
+        return tuple(names.setdefault(ball, len(names)) for ball in tube)
+
+    labels = {}
+    for index in sorted(range(len(grid)), key=lambda i: (len(grid[i]), shape(grid[i]))):
+        for ball in grid[index]:
+            if ball not in labels:
+                labels[ball] = chr(ord('a') + len(labels))
+
+    renamed = [''.join(labels[ball] for ball in tube) for tube in grid]
+    order = sorted(range(len(grid)), key=lambda i: (len(renamed[i]), renamed[i]))
+    key = f"{stack_height}:" + ",".join(renamed[i] for i in order)
+    return key, order
+
+
+class SolutionCache:
+    # SQLite-backed cache of solved puzzles. One connection may be used
+    # from a worker thread other than the one that opened it, as long as
+    # only one thread uses it at a time.
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS solutions ("
+                " puzzle TEXT PRIMARY KEY,"
+                " moves TEXT,"
+                " length INTEGER,"
+                " optimal INTEGER NOT NULL,"
+                " used REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, grid, stack_height):
+        # (moves, optimal) with moves in grid's own tube indices, or None
+        key, order = canonical_puzzle(grid, stack_height)
+        row = self.connection.execute(
+            "SELECT moves, optimal FROM solutions WHERE puzzle = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self.connection:
+            self.connection.execute("UPDATE solutions SET used = ? WHERE puzzle = ?",
+                                    (time.time(), key))
+        moves, optimal = row
+        if moves is not None:
+            moves = [(order[from_idx], order[to_idx], move_count)
+                     for from_idx, to_idx, move_count in json.loads(moves)]
+        return moves, bool(optimal)
+
+    def put(self, grid, stack_height, moves, optimal):
+        # Store moves for grid (None if it has no solution). An entry that
+        # is already optimal, or shorter and equally optimal, is kept.
+        key, order = canonical_puzzle(grid, stack_height)
+        length = None
+        if moves is not None:
+            position = {index: c for c, index in enumerate(order)}
+            length = len(moves)
+            moves = json.dumps([(position[from_idx], position[to_idx], move_count)
+                                for from_idx, to_idx, move_count in moves])
+
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT length, optimal FROM solutions WHERE puzzle = ?", (key,)).fetchone()
+            if row is not None:
+                old_length, old_optimal = row
+                if old_optimal or (not optimal and old_length is not None and
+                                   length is not None and old_length <= length):
+                    return
+            self.connection.execute(
+                "INSERT OR REPLACE INTO solutions (puzzle, moves, length, optimal, used) "
+                "VALUES (?, ?, ?, ?, ?)", (key, moves, length, int(optimal), time.time()))
+            self.evict()
+
+    def evict(self):
+        # Drop the least recently used entries above max_entries
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM solutions WHERE puzzle IN "
+                "(SELECT puzzle FROM solutions ORDER BY used LIMIT ?)", (excess,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
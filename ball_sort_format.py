@@ -0,0 +1,307 @@
+"""Compact binary file format for large Ball Sort puzzle corpora.
+
+A file starts with one line of text naming the board shape and colors,
+
+    BALLSORT 1 tubes=10 height=4 colors=rgbypcom solutions=1
+
+followed by binary records. A record is the puzzle as fixed-width color
+indices (bits per ball enough for every color plus 0 for an empty slot,
+height slots per tube, bottom first), packed little-endian into whole
+bytes. In files with solutions=1 each puzzle is followed by a solution
+block: an unsigned 16-bit move count (NO_SOLUTION if there is none),
+then three bytes (from, to, count) per move. Without solutions every
+record has the same size, so records can also be read by index.
+
+PuzzleReader maps the file into memory and decodes records lazily, so
+multi-GB corpora are read in constant memory:
+
+    with PuzzleWriter("levels.bsp", tubes=10, stack_height=4, solutions=True) as writer:
+        writer.write(grid, moves)
+    for grid, moves in PuzzleReader("levels.bsp"):
+        ...
+
+Converting to and from the solver's text format (one puzzle per line).
+Solutions travel as "# solution: 1>5 4>1 ..." or "# no solution" comments
+after the puzzle, so a file converted both ways keeps them:
+
+    python ball_sort_format.py levels.txt levels.bsp
+    python ball_sort_format.py levels.bsp levels.txt
+"""
+import argparse
+import itertools
+import mmap
+import struct
+import sys
+
+import ball_sort_solver as solver
+
+MAGIC = b"BALLSORT "
+VERSION = 1
+MOVE_COUNT = struct.Struct("<H")
+NO_SOLUTION = 0xFFFF
+
+
+def record_layout(tubes, stack_height, colors):
+    # (bits per ball, bytes per puzzle)
+    bits = max(1, len(colors).bit_length())
+    return bits, (tubes * stack_height * bits + 7) // 8
+
+
+class PuzzleWriter:
+    # Write puzzles of one board shape to path (or an open binary stream).
+    # colors are the ball letters that may appear, by default the first
+    # one per tube of ball_sort_solver.PUZZLE_COLORS. With solutions=True
+    # every puzzle may carry its moves.
+    def __init__(self, path, tubes, stack_height, colors=None, solutions=False):
+        if colors is None:
+            colors = solver.PUZZLE_COLORS[:tubes]
+        if not 0 < tubes <= 255 or not 0 < stack_height <= 255:
+            raise ValueError("Tubes and height must be between 1 and 255")
+        if len(set(colors)) != len(colors) or not colors.isalnum():
+            raise ValueError(f"Colors must be distinct letters or digits, got '{colors}'")
+        self.tubes = tubes
+        self.stack_height = stack_height
+        self.colors = colors
+        self.solutions = solutions
+        self.color_index = {color: i + 1 for i, color in enumerate(colors)}
+        self.bits, self.puzzle_bytes = record_layout(tubes, stack_height, colors)
+        self.written = 0
+
+        self.owns_stream = isinstance(path, str)
+        self.stream = open(path, "wb") if self.owns_stream else path
+        self.stream.write(f"BALLSORT {VERSION} tubes={tubes} height={stack_height} "
+                          f"colors={colors} solutions={int(solutions)}\n".encode("ascii"))
+
+    def write(self, grid, moves=None):
+        if len(grid) != self.tubes:
+            raise ValueError(f"Expected {self.tubes} tubes, got {len(grid)}")
+        value = 0
+        shift = 0
+        for tube in grid:
+            if len(tube) > self.stack_height:
+                raise ValueError(f"Tube '{tube}' is higher than {self.stack_height}")
+            for ball in tube:
+                if ball not in self.color_index:
+                    raise ValueError(f"Color '{ball}' is not one of '{self.colors}'")
+                value |= self.color_index[ball] << shift
+                shift += self.bits
+            shift += self.bits * (self.stack_height - len(tube))
+        record = value.to_bytes(self.puzzle_bytes, "little")
+
+        if self.solutions:
+            if moves is None:
+                record += MOVE_COUNT.pack(NO_SOLUTION)
+            else:
+                if len(moves) >= NO_SOLUTION:
+                    raise ValueError(f"Solutions are limited to {NO_SOLUTION - 1} moves")
+                record += MOVE_COUNT.pack(len(moves)) + bytes(
+                    number for move in moves for number in move)
+        elif moves is not None:
+            raise ValueError("This file was opened without solutions")
+
+        self.stream.write(record)
+        self.written += 1
+
+    def close(self):
+        if self.owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PuzzleReader:
+    # Memory-mapped reader of a PuzzleWriter file. Iterating yields
+    # (grid, moves) pairs, moves being None without a solution. Files
+    # without solutions also support len() and indexing.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as stream:
+            self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        end = self.map.find(b"\n", 0, 1024)
+        if self.map[:len(MAGIC)] != MAGIC or end < 0:
+            self.map.close()
+            raise ValueError(f"{path} is not a Ball Sort puzzle file")
+        fields = self.map[len(MAGIC):end].decode("ascii").split()
+        if fields[0] != str(VERSION):
+            self.map.close()
+            raise ValueError(f"{path} has format version {fields[0]}, expected {VERSION}")
+        header = dict(field.split("=", 1) for field in fields[1:])
+        self.tubes = int(header["tubes"])
+        self.stack_height = int(header["height"])
+        self.colors = header["colors"]
+        self.solutions = header.get("solutions") == "1"
+        self.bits, self.puzzle_bytes = record_layout(self.tubes, self.stack_height, self.colors)
+        self.start = end + 1
+        if not self.solutions and (len(self.map) - self.start) % self.puzzle_bytes:
+            self.map.close()
+            raise ValueError(f"{path} ends in a truncated record")
+
+    def decode(self, offset):
+        # Grid of the puzzle record at offset
+        value = int.from_bytes(self.map[offset:offset + self.puzzle_bytes], "little")
+        mask = (1 << self.bits) - 1
+        letters = " " + self.colors
+        grid = []
+        for _ in range(self.tubes):
+            tube = []
+            for _ in range(self.stack_height):
+                index = value & mask
+                value >>= self.bits
+                if index:
+                    tube.append(letters[index])
+            grid.append(''.join(tube))
+        return grid
+
+    def __iter__(self):
+        offset = self.start
+        size = len(self.map)
+        while offset < size:
+            if offset + self.puzzle_bytes > size:
+                raise ValueError(f"{self.path} ends in a truncated record")
+            grid = self.decode(offset)
+            offset += self.puzzle_bytes
+            moves = None
+            if self.solutions:
+                if offset + MOVE_COUNT.size > size:
+                    raise ValueError(f"{self.path} ends in a truncated record")
+                (count,) = MOVE_COUNT.unpack_from(self.map, offset)
+                offset += MOVE_COUNT.size
+                if count != NO_SOLUTION:
+                    if offset + 3 * count > size:
+                        raise ValueError(f"{self.path} ends in a truncated record")
+                    block = self.map[offset:offset + 3 * count]
+                    moves = [tuple(block[k:k + 3]) for k in range(0, len(block), 3)]
+                    offset += 3 * count
+            yield grid, moves
+
+    def __len__(self):
+        if self.solutions:
+            raise TypeError("Records with solutions vary in size; iterate to count them")
+        return (len(self.map) - self.start) // self.puzzle_bytes
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("puzzle index out of range")
+        return self.decode(self.start + index * self.puzzle_bytes)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_puzzle_file(path):
+    # Whether path is in this binary format rather than the text format
+    with open(path, "rb") as stream:
+        return stream.read(len(MAGIC)) == MAGIC
+
+
+def iter_puzzles(path):
+    # (grid, stack height) of each puzzle of a binary puzzle file, lazily,
+    # with the height the header states; the file stays mapped until the
+    # iteration ends
+    with PuzzleReader(path) as reader:
+        for grid, _ in reader:
+            yield grid, reader.stack_height
+
+
+def format_solution(moves):
+    # Comment carrying a solution on a puzzle line of the text format
+    if moves is None:
+        return "# no solution"
+    return f"# solution: {solver.format_moves(moves)}".rstrip()
+
+
+def parse_solution(line, stack_height=None):
+    # (grid, moves, has solution) of a text puzzle line; moves are read
+    # back from a format_solution comment, taking from each tube as many
+    # balls as the move can carry (as every solver move does). Other
+    # comments carry no solution.
+    line, _, comment = line.partition('#')
+    grid = solver.parse_puzzle(line.strip())
+    stack_height = stack_height or solver.infer_stack_height(grid)
+    comment = comment.strip()
+    if comment == "no solution":
+        return grid, None, True
+    if not comment.startswith("solution:"):
+        return grid, None, False
+
+    moves = []
+    state = list(grid)
+    for pair in comment[len("solution:"):].split():
+        from_idx, to_idx = (int(number) - 1 for number in pair.split('>'))
+        count = solver.count_movable_balls(state[from_idx], state[to_idx], stack_height)
+        if not count:
+            raise ValueError(f"Move {pair} is not legal in '{line.strip()}'")
+        moves.append((from_idx, to_idx, count))
+        state = solver.apply_moves(state, [moves[-1]])
+    return grid, moves, True
+
+
+def read_solutions(stream, stack_height=None):
+    # (grid, moves, has solution) of every puzzle line of a text file
+    for line in stream:
+        if line.split('#', 1)[0].strip():
+            yield parse_solution(line, stack_height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert Ball Sort puzzles between the text and binary formats.")
+    parser.add_argument("source", help="puzzle file to read, text or binary")
+    parser.add_argument("target", help="file to write, in the other format")
+    parser.add_argument("--colors",
+                        help="ball letters for a binary target (default: those of the puzzles "
+                             "in the first 1000 lines, or the first one per tube)")
+    args = parser.parse_args(argv)
+
+    if is_puzzle_file(args.source):
+        with PuzzleReader(args.source) as reader, open(args.target, "w") as stream:
+            for grid, moves in reader:
+                line = solver.format_puzzle(grid)
+                if reader.solutions:
+                    line += f"  {format_solution(moves)}"
+                stream.write(line + "\n")
+        return 0
+
+    with open(args.source) as stream:
+        puzzles = read_solutions(stream)
+        first = next(puzzles, None)
+        if first is None:
+            print(f"{args.source} holds no puzzles", file=sys.stderr)
+            return 1
+        stack_height = solver.infer_stack_height(first[0])
+        # The sample decides the colors (unless given) and whether the
+        # puzzles carry solutions
+        letters = set(''.join(first[0]))
+        solutions = first[2]
+        with open(args.source) as sample:
+            for _, (grid, _, has_solution) in zip(range(1000), read_solutions(sample, stack_height)):
+                letters.update(''.join(grid))
+                solutions = solutions or has_solution
+        colors = args.colors
+        if colors is None:
+            colors = ''.join(color for color in solver.PUZZLE_COLORS if color in letters)
+            colors += ''.join(sorted(letters - set(colors)))
+        with PuzzleWriter(args.target, len(first[0]), stack_height, colors, solutions) as writer:
+            for grid, moves, _ in itertools.chain([first], puzzles):
+                writer.write(grid, moves)
+    print(f"{writer.written} puzzles written to {args.target}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
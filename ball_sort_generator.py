@@ -0,0 +1,253 @@
+"""Difficulty-graded Ball Sort level generator.
+
+Draws random levels, solves each one with A* to prove it solvable and
+grade it by its shortest solution length and the nodes A* expanded, and
+keeps those inside the requested difficulty range. Levels are generated
+in parallel on a process pool and written one JSON object per line (or
+as a puzzle file with --text), in order. Level i of a run depends only on
+the seed, the board size and i, so a run is reproducible with any number
+of workers:
+
+    python ball_sort_generator.py 1000 --tubes 8 --height 4 --min-length 20 --seed 7
+    python ball_sort_generator.py 50 --tubes 10 --height 6 --min-nodes 5000 --text > hard.txt
+
+With --scramble N levels are instead made without any search, by playing
+N random moves backwards from a solved board. Such a level is solvable by
+construction, and the N moves undone in reverse are a solution, so N is an
+upper bound on its length:
+
+    python ball_sort_generator.py 1000000 --tubes 10 --height 4 --scramble 60 --text
+
+--out FILE writes the levels to a binary ball_sort_format file instead,
+with their solutions: the shortest one A* found for graded levels, the
+undone scramble for scrambled ones.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import ball_sort_format
+import ball_sort_solver as solver
+
+# Nodes A* may expand to grade one candidate before it is discarded
+GRADE_NODES = 200000
+
+# Scrambling workers keep one PackedBoard per board shape, replaced once its
+# cache of tube values grows past this many entries
+TUBE_CACHE_LIMIT = 1000000
+_scramble_boards = {}
+
+
+def grade(grid, stack_height, max_nodes=GRADE_NODES):
+    # (shortest solution, nodes expanded) of grid, or None if it has no
+    # solution or could not be solved within max_nodes
+    if solver.find_unsolvable(grid, stack_height) is not None:
+        return None
+    monitor = solver.SearchMonitor(max_nodes=max_nodes)
+    try:
+        moves = solver.solve(grid, stack_height, "astar", monitor)
+    except solver.SearchAborted:
+        return None
+    if moves is None:
+        return None
+    return moves, monitor.expanded
+
+
+def in_range(value, low, high):
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+def generate_level(task):
+    # Worker side: draw candidates for one level until one grades within
+    # the target ranges or max_attempts candidates have been tried
+    index, seed, tubes, stack_height, empty, target, max_attempts, grade_nodes = task
+    min_length, max_length, min_nodes, max_nodes = target
+    rng = random.Random(f"{seed}:{tubes}x{stack_height}:{index}")
+    started = time.time()
+    for attempt in range(1, max_attempts + 1):
+        grid = solver.random_puzzle(tubes, stack_height, rng, empty)
+        grading = grade(grid, stack_height, grade_nodes)
+        if grading is None:
+            continue
+        moves, nodes = grading
+        length = len(moves)
+        if in_range(length, min_length, max_length) and in_range(nodes, min_nodes, max_nodes):
+            return {"index": index, "puzzle": grid, "height": stack_height, "length": length,
+                    "nodes": nodes, "attempts": attempt, "moves": moves,
+                    "seconds": round(time.time() - started, 4)}
+
+    return {"index": index, "puzzle": None, "height": stack_height, "length": None,
+            "nodes": None, "attempts": max_attempts, "moves": None,
+            "seconds": round(time.time() - started, 4)}
+
+
+def generate_levels(count, tubes, stack_height, seed=0, empty=2, min_length=None,
+                    max_length=None, min_nodes=None, max_nodes=None, max_attempts=1000,
+                    grade_nodes=GRADE_NODES, jobs=None, chunksize=8):
+    # Generate count levels on a pool of jobs processes (default: all
+    # cores), yielding one result dict per level in index order. A level
+    # whose "puzzle" is None found no candidate within max_attempts.
+    target = (min_length, max_length, min_nodes, max_nodes)
+    tasks = ((index, seed, tubes, stack_height, empty, target, max_attempts, grade_nodes)
+             for index in range(count))
+
+    if jobs == 1:
+        yield from map(generate_level, tasks)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(generate_level, tasks, chunksize)
+
+
+def scramble_board(tubes, stack_height, empty):
+    # (board, solved state) for scrambling boards of this shape in this process
+    board, goal = _scramble_boards.get((tubes, stack_height, empty), (None, None))
+    if board is None or len(board.info) > TUBE_CACHE_LIMIT:
+        colors = solver.PUZZLE_COLORS[:tubes - empty]
+        grid = [color * stack_height for color in colors] + [''] * empty
+        board = solver.PackedBoard(grid, stack_height, pruning=())
+        goal = tuple(board.encode(grid))
+        _scramble_boards[tubes, stack_height, empty] = board, goal
+    return board, goal
+
+
+def scramble_level(task):
+    # Worker side: play up to scramble random reverse moves from the solved
+    # board, then shuffle the tube order. Returns the level with the
+    # forward moves that solve it. Reverse moves split runs up, and a
+    # position where every top ball sits on another color is reached by no
+    # legal move, so the walk cannot go on from there. The walk prefers
+    # moves to positions it can go on from, never undoes the previous move,
+    # and ends early on a position without a way on, which is then as
+    # scrambled as reverse play can make it.
+    index, seed, tubes, stack_height, empty, scramble = task
+    rng = random.Random(f"{seed}:{tubes}x{stack_height}:scramble:{index}")
+    board, state = scramble_board(tubes, stack_height, empty)
+    state = list(state)
+    undone = []
+    moves = board.reverse_moves(state)
+    while moves and (len(undone) < scramble or board.is_solved(state)):
+        rng.shuffle(moves)
+        fallback = None
+        for move in moves:
+            from_idx, to_idx, move_count = move
+            if undone and undone[-1] == (to_idx, from_idx, move_count):
+                continue
+            child = list(state)
+            child[from_idx], child[to_idx] = board.move(state[from_idx], state[to_idx], move_count)
+            child_moves = board.reverse_moves(child)
+            if child_moves:
+                break
+            fallback = fallback or (move, child, child_moves)
+        else:
+            if fallback is None:
+                break  # Only the previous move could be undone
+            move, child, child_moves = fallback
+        state = child
+        moves = child_moves
+        undone.append(move)
+
+    grid = board.decode(state)
+    order = list(range(tubes))
+    rng.shuffle(order)
+    position = {index: p for p, index in enumerate(order)}
+    moves = [(position[to_idx], position[from_idx], move_count)
+             for from_idx, to_idx, move_count in reversed(undone)]
+    return {"index": index, "puzzle": [grid[i] for i in order], "height": stack_height,
+            "bound": len(moves), "moves": moves}
+
+
+def scramble_levels(count, tubes, stack_height, scramble, seed=0, empty=2, jobs=None,
+                    chunksize=256):
+    # Make count levels with scramble_level on a pool of jobs processes,
+    # yielding them in index order. Work per level is linear in scramble
+    # and nothing is kept between levels, so count may be unbounded.
+    if not 0 < tubes - empty <= len(solver.PUZZLE_COLORS):
+        raise ValueError(f"Need 1 to {len(solver.PUZZLE_COLORS)} filled tubes, "
+                         f"got {tubes - empty}")
+    if empty < 1:
+        raise ValueError("Need an empty tube to scramble a solved board")
+    tasks = ((index, seed, tubes, stack_height, empty, scramble) for index in range(count))
+
+    if jobs == 1:
+        yield from map(scramble_level, tasks)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(scramble_level, tasks, chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate graded, solvable Ball Sort levels.")
+    parser.add_argument("count", type=int, help="number of levels to generate")
+    parser.add_argument("--tubes", type=int, default=6, help="tubes per level (default: 6)")
+    parser.add_argument("--height", type=int, default=4, help="tube height (default: 4)")
+    parser.add_argument("--empty", type=int, default=2, help="empty tubes (default: 2)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the run (default: 0)")
+    parser.add_argument("--min-length", type=int, help="shortest solution at least this long")
+    parser.add_argument("--max-length", type=int, help="shortest solution at most this long")
+    parser.add_argument("--min-nodes", type=int, help="A* expands at least this many nodes")
+    parser.add_argument("--max-nodes", type=int, help="A* expands at most this many nodes")
+    parser.add_argument("--max-attempts", type=int, default=1000,
+                        help="candidates drawn per level before giving up (default: 1000)")
+    parser.add_argument("--grade-nodes", type=int, default=GRADE_NODES,
+                        help=f"node budget for grading one candidate (default: {GRADE_NODES})")
+    parser.add_argument("--scramble", type=int, metavar="N",
+                        help="make levels by playing N random moves backwards from a solved "
+                             "board, without grading them")
+    parser.add_argument("--jobs", type=int,
+                        help="worker processes (default: number of cores)")
+    parser.add_argument("--text", action="store_true",
+                        help="write a puzzle file (one level per line) instead of JSON")
+    parser.add_argument("--out", metavar="FILE",
+                        help="write the levels to FILE in the binary puzzle format instead")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    made = 0
+    if args.scramble is not None:
+        if any(limit is not None for limit in (args.min_length, args.max_length,
+                                               args.min_nodes, args.max_nodes)):
+            parser.error("--scramble levels are not graded, so length and node ranges "
+                         "do not apply")
+        levels = scramble_levels(args.count, args.tubes, args.height, args.scramble, args.seed,
+                                 args.empty, args.jobs)
+    else:
+        levels = generate_levels(args.count, args.tubes, args.height, args.seed, args.empty,
+                                 args.min_length, args.max_length, args.min_nodes, args.max_nodes,
+                                 args.max_attempts, args.grade_nodes, args.jobs)
+    writer = None
+    if args.out is not None:
+        writer = ball_sort_format.PuzzleWriter(args.out, args.tubes, args.height,
+                                               solver.PUZZLE_COLORS[:args.tubes - args.empty],
+                                               solutions=True)
+    # Graded levels are slow enough to flush each one as it arrives
+    flush = args.scramble is None
+    for level in levels:
+        if level["puzzle"] is None:
+            if not args.text and writer is None:
+                print(json.dumps(level), flush=flush)
+            continue
+        made += 1
+        if writer is not None:
+            writer.write(level["puzzle"], level["moves"])
+        elif not args.text:
+            print(json.dumps(level), flush=flush)
+        elif args.scramble is not None:
+            print(f"{solver.format_puzzle(level['puzzle'])}  # at most {level['bound']} moves")
+        else:
+            print(f"{solver.format_puzzle(level['puzzle'])}  "
+                  f"# length {level['length']}, {level['nodes']} nodes", flush=flush)
+    if writer is not None:
+        writer.close()
+
+    # Summary on stderr so stdout stays machine-readable
+    elapsed = time.time() - started
+    print(f"{made}/{args.count} levels in {elapsed:.2f}s "
+          f"({made / elapsed if elapsed > 0 else 0:.0f} levels/s)", file=sys.stderr)
+    return 0 if made == args.count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
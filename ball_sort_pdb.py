@@ -0,0 +1,278 @@
+"""Pattern databases for the Ball Sort solver.
+
+A pattern database stores, for one board shape (tubes, tube height and
+number of colors), the exact number of moves needed to solve every
+position of a simplified puzzle in which only `kept` colors keep their
+identity and all other balls look alike. Any real move is also a move of
+the simplified puzzle, so these distances never overestimate and can be
+used as an admissible heuristic. The colors of a board are split into
+groups of `kept`, and the estimate of a position is the largest distance
+over its groups.
+
+Databases are built offline and stored as a compact open-addressing table
+of 64-bit position hashes and one-byte distances, which the solver maps
+into memory instead of reading:
+
+    python ball_sort_pdb.py 6x4 10x4 14x4 --dir pdb
+    python ball_sort_solver.py puzzles.txt --pdb pdb
+"""
+import argparse
+from array import array
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+# Simplified positions are identified by a sum of per-tube Zobrist hashes,
+# drawn from a fixed seed so databases built anywhere agree with the solver
+PDB_SEED = 20250202
+HASH_MASK = (1 << 64) - 1
+
+# File layout: header, then `slots` 64-bit keys (0 = empty slot), then
+# `slots` one-byte distances, all in the byte order of the machine that
+# built it. The byte-order mark rejects files built with the other one.
+MAGIC = b"BSPDB1\0\0"
+HEADER = struct.Struct("=8sQIIIIQ")
+BYTE_ORDER_MARK = 0x0102030405060708
+
+# Open databases by path, so every solve on one shape shares one mapping
+_open_databases = {}
+
+
+def database_name(tubes, height, colors, kept):
+    return f"ball_sort_{tubes}x{height}_{colors}c_k{kept}.pdb"
+
+
+def tube_hashes(height, kept):
+    # zobrist[position][symbol], symbol 0 is an "other" ball and 1..kept
+    # the kept colors
+    rng = random.Random(PDB_SEED)
+    return [[rng.getrandbits(64) for _ in range(kept + 1)] for _ in range(height)]
+
+
+def position_key(tubes, zobrist):
+    # Hash of a simplified position (a sequence of symbol tuples); the sum
+    # ignores tube order, and 0 is reserved for empty slots
+    total = 0
+    for tube in tubes:
+        tube_hash = 0
+        for position, symbol in enumerate(tube):
+            tube_hash ^= zobrist[position][symbol]
+        total += tube_hash
+    return (total & HASH_MASK) or 1
+
+
+def reverse_moves(state, height):
+    # Simplified positions one move before state. A forward move takes n
+    # balls of the top symbol onto an empty tube or one ending in the same
+    # symbol. For a kept color n is the whole run unless the destination
+    # fills up. Other balls may stand for several colors, so any n up to
+    # their run is possible; the simplified puzzle then allows at least
+    # every real move and its distances stay lower bounds.
+    tubes = list(state)
+    found = set()
+    for j, tube in enumerate(tubes):
+        if not tube:
+            continue
+        symbol = tube[-1]
+        run = 1
+        while run < len(tube) and tube[-run-1] == symbol:
+            run += 1
+        # The move landed on an empty tube or on the same symbol
+        most = run if run == len(tube) else run - 1
+        for count in range(1, most + 1):
+            rest = tube[:-count]
+            for i, source in enumerate(tubes):
+                if i == j or len(source) + count > height:
+                    continue
+                if symbol and source and source[-1] == symbol and count != height - len(rest):
+                    continue  # A kept run is only split by a full destination
+                before = list(tubes)
+                before[j] = rest
+                before[i] = source + (symbol,) * count
+                found.add(tuple(sorted(before)))
+    return found
+
+
+def build(tubes, height, colors, kept=1, progress=None):
+    # Breadth-first search backwards from the solved simplified position,
+    # returning {position key: distance}. progress(positions, distance) is
+    # called after every completed distance.
+    if not 1 <= kept <= colors <= tubes:
+        raise ValueError("Need 1 <= kept <= colors <= tubes")
+    zobrist = tube_hashes(height, kept)
+    goal = ([(symbol,) * height for symbol in range(1, kept + 1)] +
+            [(0,) * height] * (colors - kept) + [()] * (tubes - colors))
+    goal = tuple(sorted(goal))
+
+    seen = {goal}
+    distances = {position_key(goal, zobrist): 0}
+    layer = [goal]
+    distance = 0
+    while layer:
+        distance += 1
+        next_layer = []
+        for state in layer:
+            for before in reverse_moves(state, height):
+                if before not in seen:
+                    seen.add(before)
+                    distances.setdefault(position_key(before, zobrist), distance)
+                    next_layer.append(before)
+        layer = next_layer
+        if progress is not None:
+            progress(len(distances), distance)
+
+    return distances
+
+
+def write(path, tubes, height, colors, kept, distances):
+    # Store distances as an open-addressing table at most half full
+    slots = 2
+    while slots < 2 * len(distances):
+        slots *= 2
+    keys = array('Q', bytes(8 * slots))
+    values = array('B', bytes(slots))
+    for key, distance in distances.items():
+        slot = key & (slots - 1)
+        while keys[slot]:
+            slot = (slot + 1) & (slots - 1)
+        keys[slot] = key
+        values[slot] = min(distance, 255)
+
+    with open(path, "wb") as stream:
+        stream.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, tubes, height, colors, kept, slots))
+        keys.tofile(stream)
+        values.tofile(stream)
+
+
+class PatternDatabase:
+    # A database file mapped into memory. lookup() probes the table in
+    # place, so opening costs no time or memory beyond the mapping.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as stream:
+            self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, mark, self.tubes, self.height, self.colors, self.kept, self.slots = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a pattern database")
+        if mark != BYTE_ORDER_MARK:
+            raise ValueError(f"{path} was built on a machine with another byte order")
+
+        start = HEADER.size
+        view = memoryview(self.map)
+        self.keys = view[start:start + 8 * self.slots].cast('Q')
+        self.values = view[start + 8 * self.slots:start + 9 * self.slots]
+        self.zobrist = tube_hashes(self.height, self.kept)
+
+    def lookup(self, key):
+        # Distance of the simplified position with this key, 0 if unknown
+        keys = self.keys
+        mask = self.slots - 1
+        slot = key & mask
+        while True:
+            found = keys[slot]
+            if found == key:
+                return self.values[slot]
+            if not found:
+                return 0
+            slot = (slot + 1) & mask
+
+    def estimator(self, board, tubes):
+        # Heuristic function for states of a PackedBoard with this many
+        # tubes: the largest database distance over the board's color groups
+        if (tubes, board.stack_height, len(board.colors)) != (self.tubes, self.height, self.colors):
+            raise ValueError(f"{self.path} is for {self.tubes} tubes of {self.height} "
+                             f"with {self.colors} colors")
+        groups = len(board.colors) // self.kept
+        zobrist = self.zobrist
+
+        def group_hashes(value):
+            # Simplified hash of a packed tube for each color group
+            hashes = [0] * groups
+            position = 0
+            while value:
+                color = (value & board.mask) - 1
+                group, symbol = divmod(color, self.kept)
+                for g in range(groups):
+                    hashes[g] ^= zobrist[position][symbol + 1 if g == group else 0]
+                value >>= board.bits
+                position += 1
+            return tuple(hashes)
+
+        lookup = self.lookup
+        cache = {}
+
+        def estimate(state):
+            rows = []
+            for value in state:
+                hashes = cache.get(value)
+                if hashes is None:
+                    hashes = cache[value] = group_hashes(value)
+                rows.append(hashes)
+            return max(lookup((sum(column) & HASH_MASK) or 1) for column in zip(*rows))
+
+        return estimate
+
+    def close(self):
+        self.keys.release()
+        self.values.release()
+        self.map.close()
+
+
+def find_database(directory, tubes, height, colors):
+    # The database for this board shape in directory with the most kept
+    # colors, or None if there is none. Opened databases are shared.
+    best = None
+    for kept in range(colors, 0, -1):
+        path = os.path.join(directory, database_name(tubes, height, colors, kept))
+        if path in _open_databases:
+            return _open_databases[path]
+        if os.path.exists(path):
+            best = _open_databases[path] = PatternDatabase(path)
+            break
+    return best
+
+
+def parse_size(text):
+    # "14x4" -> (14, 4)
+    try:
+        tubes, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected TUBESxHEIGHT, got '{text}'")
+    return tubes, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build Ball Sort pattern databases.")
+    parser.add_argument("sizes", nargs="+", type=parse_size,
+                        help="board sizes as TUBESxHEIGHT, e.g. 6x4 10x4 14x4")
+    parser.add_argument("--colors", type=int,
+                        help="colors on the board (default: two fewer than tubes)")
+    parser.add_argument("--kept", type=int, default=1,
+                        help="colors told apart in the simplified puzzle (default: 1)")
+    parser.add_argument("--dir", default="pdb",
+                        help="directory to write the databases to (default: pdb)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dir, exist_ok=True)
+    for tubes, height in args.sizes:
+        colors = args.colors or tubes - 2
+        started = time.time()
+
+        def report(positions, distance):
+            print(f"  distance {distance}: {positions:,} positions", file=sys.stderr)
+
+        distances = build(tubes, height, colors, args.kept, report)
+        path = os.path.join(args.dir, database_name(tubes, height, colors, args.kept))
+        write(path, tubes, height, colors, args.kept, distances)
+        print(f"{path}: {len(distances):,} positions, {os.path.getsize(path):,} bytes, "
+              f"{time.time() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
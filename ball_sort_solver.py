@@ -0,0 +1,1547 @@
+"""Headless Ball Sort Puzzle solver.
+
+Pure-Python solver shared by the tkinter GUI and the command line. Puzzles
+are lists of strings, one per tube, bottom ball first, e.g.
+["gbbb", "ybry", "yggy", "rrrg", "", ""]. Moves are (from, to, count)
+tuples with 0-based tube indices.
+
+Command line usage (one puzzle per line, tubes separated by spaces or
+commas, "-" for an empty tube):
+
+    python ball_sort_solver.py puzzles.txt
+    echo "gbbb ybry yggy rrrg - -" | python ball_sort_solver.py --mode greedy
+"""
+import argparse
+from array import array
+import cProfile
+import heapq
+import itertools
+import json
+import pstats
+import random
+import sys
+import time
+
+import ball_sort_cache
+import ball_sort_pdb
+
+# Expanded nodes between progress reports, cancellation and time checks
+PROGRESS_INTERVAL = 2000
+
+# Functions listed on stderr after a --profile run
+PROFILE_LINES = 25
+
+# State hashes are 64-bit Zobrist sums, drawn from a fixed seed so the same
+# puzzle hashes the same in every process and run
+HASH_MASK = (1 << 64) - 1
+ZOBRIST_SEED = 20250101
+
+# Move pruning rules applied by PackedBoard.moves:
+#   "whole-tube"   - no moving a single-color tube into an empty tube (only
+#                    permutes the tubes)
+#   "first-empty"  - of several empty tubes only the first is a destination
+#                    (they are interchangeable)
+#   "no-reversal"  - no move that exactly undoes the previous one
+#   "keep-settled" - two single-color tubes of one color merge in one
+#                    direction only, into the taller (or on a tie the
+#                    earlier) tube; the other direction gives the same tubes
+#   "no-split"     - no move that leaves part of the top run behind because
+#                    the destination is too small
+#   "lone-ball"    - no moving the only ball of its color in a tube into an
+#                    empty tube. The original solver's rule; it can make a
+#                    solvable puzzle look unsolvable, so it is off by default.
+# Every default rule keeps all solvable puzzles solvable and A* shortest
+# (test_ball_sort_solver.py checks this against unpruned breadth-first
+# search on small boards).
+PRUNING_RULES = ("whole-tube", "first-empty", "no-reversal", "keep-settled", "no-split", "lone-ball")
+DEFAULT_PRUNING = frozenset(("whole-tube", "first-empty", "no-reversal", "keep-settled", "no-split"))
+
+
+class SearchAborted(Exception):
+    # Raised when a search is cancelled or runs out of its node or time budget
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class SearchMonitor:
+    # Progress reporting, cancellation, node/time budgets and statistics
+    # shared by all search modes. Searches call tick() once per expanded
+    # node and record() with the number of children it generated; every
+    # PROGRESS_INTERVAL nodes tick() calls progress(nodes, frontier,
+    # elapsed) and checks the cancel event (a threading.Event) and the time
+    # limit. stats() summarises the search so far. With timing=True the
+    # searches also charge the time spent in the board's move generation,
+    # child construction, hashing and heuristic to separate timers (see
+    # instrument), which slows them down noticeably.
+    def __init__(self, progress=None, cancel=None, max_nodes=None, time_limit=None,
+                 timing=False):
+        self.progress = progress
+        self.cancel = cancel
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.started = time.time()
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.dead = 0  # Expanded nodes cut as dead ends (PackedBoard.dead_end)
+        self.max_frontier = 0
+        # Expanded nodes and generated children per depth
+        self.depth_expanded = []
+        self.depth_generated = []
+        self.timing = timing
+        self.timings = {}
+        self.timer_stack = []
+        self.timer_mark = 0.0
+    
+    def tick(self, frontier):
+        self.expanded += 1
+        if frontier > self.max_frontier:
+            self.max_frontier = frontier
+        if self.max_nodes is not None and self.expanded > self.max_nodes:
+            raise SearchAborted("node limit")
+        if self.expanded % PROGRESS_INTERVAL == 0:
+            self.check(frontier)
+    
+    def check(self, frontier):
+        elapsed = self.elapsed()
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchAborted("cancelled")
+        if self.time_limit is not None and elapsed >= self.time_limit:
+            raise SearchAborted("time limit")
+        if self.progress is not None:
+            self.progress(self.expanded, frontier, elapsed)
+    
+    def record(self, depth, generated, duplicates=0):
+        # A node at depth was expanded into generated children, of which
+        # duplicates led to states already reached at least as cheaply
+        self.generated += generated
+        self.duplicates += duplicates
+        while depth >= len(self.depth_expanded):
+            self.depth_expanded.append(0)
+            self.depth_generated.append(0)
+        self.depth_expanded[depth] += 1
+        self.depth_generated[depth] += generated
+    
+    def elapsed(self):
+        return time.time() - self.started
+    
+    def instrument(self, board):
+        # With timing on, route the PackedBoard's methods through timers:
+        # "moves" (move generation), "children" (child tube values with
+        # their incremental heuristic), "hashing" (state hashes and hash
+        # deltas, also the ones successors computes inline) and "heuristic"
+        # (full heuristic evaluations)
+        if self.timing:
+            board.moves = self.timed("moves", board.moves)
+            board.reverse_moves = self.timed("moves", board.reverse_moves)
+            board.successors = self.timed("children", board.successors)
+            board.move = self.timed("children", board.move)
+            board.state_hash = self.timed("hashing", board.state_hash)
+            board.hash_delta = self.timed("hashing", board.hash_delta)
+            board.heuristic = self.timed("heuristic", board.heuristic)
+            board.hash_timer = self.switch_timer
+    
+    def timed(self, name, function):
+        # function charging its run time, less that of the timed functions
+        # it calls, to timings[name]; function itself without timing
+        if not self.timing:
+            return function
+        
+        def timed_function(*args, **kwargs):
+            self.switch_timer(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.switch_timer(None)
+        
+        return timed_function
+    
+    def switch_timer(self, name):
+        # Start timing name on top of the running timer, or stop the
+        # innermost timer if name is None
+        now = time.perf_counter()
+        if self.timer_stack:
+            running = self.timer_stack[-1]
+            self.timings[running] = self.timings.get(running, 0.0) + now - self.timer_mark
+        if name is None:
+            self.timer_stack.pop()
+        else:
+            self.timer_stack.append(name)
+        self.timer_mark = now
+    
+    def stats(self):
+        # JSON-ready summary of the search so far. branching[d] is the mean
+        # number of children generated per node expanded at depth d.
+        elapsed = self.elapsed()
+        stats = {
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "dead": self.dead,
+            "max_depth": len(self.depth_expanded) - 1 if self.depth_expanded else 0,
+            "max_frontier": self.max_frontier,
+            "seconds": round(elapsed, 4),
+            "nodes_per_second": round(self.expanded / elapsed) if elapsed > 0 else None,
+            "branching": [round(generated / expanded, 2) if expanded else 0.0
+                          for expanded, generated in zip(self.depth_expanded,
+                                                         self.depth_generated)],
+        }
+        if self.timing:
+            timings = {name: round(seconds, 4) for name, seconds in sorted(self.timings.items())}
+            timings["search"] = round(max(0.0, elapsed - sum(self.timings.values())), 4)
+            stats["timings"] = timings
+        return stats
+
+
+class TranspositionTable:
+    # Fixed-size table of 64-bit state hashes and their depth (g-cost), a
+    # bounded stand-in for the visited set / best-g map of the searches.
+    # Entries cost 12 bytes, so megabytes fixes the capacity up front.
+    # Replacement policies:
+    #   "depth"    - one slot per bucket, a new entry only replaces one that
+    #                is not shallower (shallow states root bigger subtrees)
+    #   "two-tier" - two slots per bucket, a depth-preferred slot plus an
+    #                always-replace slot for recent states; an entry pushed
+    #                out of the preferred slot moves to the other one
+    #   "always"   - one slot per bucket, newest entry wins
+    # An evicted state is simply searched again, so results stay correct;
+    # a 64-bit hash collision can in theory hide an unexplored state.
+    POLICIES = ("depth", "two-tier", "always")
+    
+    def __init__(self, megabytes=64, policy="two-tier"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown replacement policy '{policy}', expected one of {', '.join(self.POLICIES)}")
+        self.policy = policy
+        self.slots = max(2, int(megabytes * 2**20) // 12)
+        self.ways = 2 if policy == "two-tier" else 1
+        self.buckets = self.slots // self.ways
+        self.keys = array('Q', bytes(8 * self.buckets * self.ways))
+        self.depths = array('i', bytes(4 * self.buckets * self.ways))
+        self.stored = 0
+        self.evicted = 0
+    
+    def hash_key(self, key):
+        # Zobrist hashes are used as they are; 0 marks an empty slot, so
+        # never hand it out as a hash
+        if type(key) is not int:
+            key = hash(key) & HASH_MASK
+        return key or 1
+    
+    def find(self, key):
+        # Slot holding key, or -1
+        key = self.hash_key(key)
+        slot = (key % self.buckets) * self.ways
+        keys = self.keys
+        if keys[slot] == key:
+            return slot
+        if self.ways == 2 and keys[slot + 1] == key:
+            return slot + 1
+        return -1
+    
+    def __contains__(self, key):
+        return self.find(key) >= 0
+    
+    def get(self, key, default=None):
+        slot = self.find(key)
+        return self.depths[slot] if slot >= 0 else default
+    
+    def __setitem__(self, key, depth):
+        hashed = self.hash_key(key)
+        slot = (hashed % self.buckets) * self.ways
+        keys = self.keys
+        depths = self.depths
+        
+        if self.ways == 2 and keys[slot] != hashed:
+            if keys[slot] and depth > depths[slot]:
+                # Deeper than the preferred entry: use the always-replace slot
+                slot += 1
+            else:
+                # Take the depth-preferred slot and demote its entry to the
+                # always-replace slot (the second slot is only ever filled
+                # after the first, so an empty first slot means both are)
+                if not keys[slot]:
+                    self.stored += 1
+                elif keys[slot + 1] != hashed:
+                    if keys[slot + 1]:
+                        self.evicted += 1
+                    else:
+                        self.stored += 1
+                keys[slot + 1] = keys[slot]
+                depths[slot + 1] = depths[slot]
+                keys[slot] = hashed
+                depths[slot] = depth
+                return
+        elif self.policy == "depth" and keys[slot] not in (0, hashed) and depth > depths[slot]:
+            return
+        
+        if not keys[slot]:
+            self.stored += 1
+        elif keys[slot] != hashed:
+            self.evicted += 1
+        keys[slot] = hashed
+        depths[slot] = depth
+    
+    def __len__(self):
+        return self.stored
+    
+    def clear(self):
+        # Empty every slot, keeping the capacity
+        self.keys = array('Q', bytes(8 * self.buckets * self.ways))
+        self.depths = array('i', bytes(4 * self.buckets * self.ways))
+        self.stored = 0
+        self.evicted = 0
+    
+    def memory(self):
+        # Bytes held by the table
+        return self.keys.itemsize * len(self.keys) + self.depths.itemsize * len(self.depths)
+
+
+class TubeInfo(dict):
+    # Cache of per-tube facts, filled on first lookup of each tube value:
+    # (height, top color, top run length, top color total, boundaries,
+    #  bottom color, whether the top run may be moved into an empty tube
+    #  under the pruning rules, Zobrist hash of the tube)
+    def __init__(self, bits, stack_height, zobrist, pruning):
+        super().__init__()
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.stack_height = stack_height
+        self.zobrist = zobrist
+        self.whole_tube = "whole-tube" in pruning
+        self.lone_ball = "lone-ball" in pruning
+        self[0] = (0, 0, 0, 0, 0, 0, False, 0)
+    
+    def __missing__(self, value):
+        balls = []
+        rest = value
+        while rest:
+            balls.append(rest & self.mask)
+            rest >>= self.bits
+        
+        top = balls[-1]
+        run = 1
+        while run < len(balls) and balls[-run-1] == top:
+            run += 1
+        boundaries = sum(1 for k in range(1, len(balls)) if balls[k] != balls[k-1])
+        
+        spills = not ((self.whole_tube and run == len(balls)) or
+                      (self.lone_ball and balls.count(top) == 1))
+        
+        tube_hash = 0
+        for position, ball in enumerate(balls):
+            tube_hash ^= self.zobrist[position][ball]
+        
+        info = (len(balls), top, run, balls.count(top), boundaries, balls[0], spills, tube_hash)
+        self[value] = info
+        return info
+
+
+class PackedBoard:
+    # Compact board encoding used by the solvers. Every tube is a single int
+    # holding one fixed-width color index per ball (bottom ball in the lowest
+    # bits, 0 = empty slot), so states are tuples of small ints and a move is
+    # a mask and a shift instead of string slicing.
+    #
+    # States are identified by a Zobrist hash: a tube hashes to the XOR of
+    # one random number per (position, color) it holds, and a state to the
+    # sum of its tube hashes. The sum does not depend on tube order, so all
+    # permutations of a state share one hash, and a move changes it by two
+    # precomputed XORs instead of a rescan of the board.
+    #
+    # Packing made the searches 2-3x faster than on string grids, short of
+    # the 5x that was aimed for. Most of a node's cost is now the Python
+    # loops of move generation and child construction (about two thirds
+    # of A* time); the best-g dict and the heap take under a tenth.
+    def __init__(self, grid, stack_height, pruning=DEFAULT_PRUNING):
+        unknown = set(pruning) - set(PRUNING_RULES)
+        if unknown:
+            raise ValueError(f"Unknown pruning rule(s) {', '.join(sorted(unknown))}, "
+                             f"expected some of {', '.join(PRUNING_RULES)}")
+        self.stack_height = stack_height
+        self.pruning = frozenset(pruning)
+        self.colors = sorted(set(''.join(grid)))
+        self.color_index = {color: i + 1 for i, color in enumerate(self.colors)}
+        self.bits = max(1, len(self.colors).bit_length())
+        self.mask = (1 << self.bits) - 1
+        
+        rng = random.Random(ZOBRIST_SEED)
+        self.zobrist = [[rng.getrandbits(64) for _ in range(len(self.colors) + 1)]
+                        for _ in range(stack_height)]
+        self.info = TubeInfo(self.bits, stack_height, self.zobrist, self.pruning)
+        
+        # zobrist_runs[c][h][k] is the hash of k balls of color c placed on
+        # top of h others, i.e. what a move adds to or removes from a tube
+        self.zobrist_runs = [[[0] * (stack_height - h + 1) for h in range(stack_height + 1)]
+                             for _ in range(len(self.colors) + 1)]
+        for c in range(1, len(self.colors) + 1):
+            for h in range(stack_height):
+                for k in range(1, stack_height - h + 1):
+                    self.zobrist_runs[c][h][k] = self.zobrist_runs[c][h][k-1] ^ self.zobrist[h + k - 1][c]
+        
+        # low_mask[h] keeps the bottom h balls of a tube
+        self.low_mask = [(1 << (h * self.bits)) - 1 for h in range(stack_height + 1)]
+        
+        # runs[c][k] is k balls of color c stacked from bit 0 upwards
+        self.runs = [[0] * (stack_height + 1) for _ in range(len(self.colors) + 1)]
+        for c in range(1, len(self.colors) + 1):
+            for k in range(1, stack_height + 1):
+                self.runs[c][k] = self.runs[c][k-1] | (c << ((k-1) * self.bits))
+        
+        # SearchMonitor.switch_timer when timing, to charge the hash updates
+        # in successors to "hashing"
+        self.hash_timer = None
+    
+    def encode(self, grid):
+        tubes = []
+        for stack in grid:
+            value = 0
+            for j, ball in enumerate(stack):
+                value |= self.color_index[ball] << (j * self.bits)
+            tubes.append(value)
+        return tubes
+    
+    def decode(self, tubes):
+        grid = []
+        for value in tubes:
+            stack = []
+            while value:
+                stack.append(self.colors[(value & self.mask) - 1])
+                value >>= self.bits
+            grid.append(''.join(stack))
+        return grid
+    
+    def moves(self, tubes, infos=None, last=None):
+        # Moves of the top run onto a matching non-full tube or an empty tube,
+        # ordered by source tube and then destination tube, minus the moves
+        # the pruning rules drop. last is the move that led to tubes, if any.
+        if infos is None:
+            infos = list(map(self.info.__getitem__, tubes))
+        stack_height = self.stack_height
+        pruning = self.pruning
+        keep_settled = "keep-settled" in pruning
+        no_split = "no-split" in pruning
+        reversal = None
+        if last is not None and "no-reversal" in pruning:
+            reversal = (last[1], last[0], last[2])
+        
+        # Destinations are empty tubes and non-full tubes with a matching top
+        sources = []
+        empties = []
+        targets = {}
+        for j, (height, top, run, _, _, _, spills, _) in enumerate(infos):
+            if not height:
+                empties.append(j)
+                continue
+            sources.append((j, height, top, run, spills))
+            if height < stack_height:
+                if top in targets:
+                    targets[top].append(j)
+                else:
+                    targets[top] = [j]
+        if len(empties) > 1 and "first-empty" in pruning:
+            del empties[1:]
+        
+        moves = []
+        for i, height, top, run, spills in sources:
+            dests = targets.get(top, ())
+            if spills and empties:
+                dests = sorted([*dests, *empties]) if dests else empties
+            settled = keep_settled and run == height
+            
+            for j in dests:
+                if i == j:
+                    continue
+                to_height, _, to_run = infos[j][:3]
+                if not to_height:
+                    moves.append((i, j, run))
+                    continue
+                
+                move_count = min(run, stack_height - to_height)
+                if no_split and move_count < run:
+                    continue
+                if settled and to_run == to_height and (to_height < height or
+                                                        (to_height == height and j < i)):
+                    continue
+                if (i, j, move_count) == reversal:
+                    continue
+                moves.append((i, j, move_count))
+        
+        return moves
+    
+    def reverse_moves(self, tubes):
+        # Moves that undo some legal move into tubes: (i, j, k) takes k balls
+        # off tube i and puts them on tube j, undoing the move of k balls
+        # from j to i. A forward move took the whole run unless the
+        # destination filled up, so a ball may come off tube i if the ball
+        # beneath it has its color (or i is left empty), and k balls can go
+        # back onto a tube ending in the same color only if tube i is full.
+        # Of several empty tubes only the first is a destination, and the
+        # pruning rules drop the undoing of moves they drop going forward.
+        infos = list(map(self.info.__getitem__, tubes))
+        stack_height = self.stack_height
+        no_split = "no-split" in self.pruning
+        whole_tube = "whole-tube" in self.pruning
+        dests = []
+        seen_empty = False
+        for j, (height, top) in enumerate(info[:2] for info in infos):
+            if height < stack_height and not (seen_empty and not height):
+                dests.append((j, height, top))
+                seen_empty = seen_empty or not height
+        
+        moves = []
+        for i, (height, top, run) in enumerate(info[:3] for info in infos):
+            if not height:
+                continue
+            most = run if run == height else run - 1
+            for j, to_height, to_top in dests:
+                if i == j:
+                    continue
+                if to_top == top and (no_split or height < stack_height):
+                    continue
+                for move_count in range(1, min(most, stack_height - to_height) + 1):
+                    if whole_tube and move_count == height and not to_height:
+                        continue
+                    moves.append((i, j, move_count))
+        
+        return moves
+    
+    def move(self, from_value, to_value, move_count):
+        # Values of both tubes after moving move_count balls between them
+        from_height, top = self.info[from_value][:2]
+        to_height = self.info[to_value][0]
+        return (from_value & self.low_mask[from_height - move_count],
+                to_value | (self.runs[top][move_count] << (to_height * self.bits)))
+    
+    def state_hash(self, tubes):
+        info = self.info
+        return sum(info[value][7] for value in tubes) & HASH_MASK
+    
+    def hash_delta(self, from_value, to_value, move_count):
+        # Change of the state hash when move_count balls move between the tubes
+        from_height, top = self.info[from_value][:2]
+        from_hash = self.info[from_value][7]
+        to_height = self.info[to_value][0]
+        to_hash = self.info[to_value][7]
+        runs = self.zobrist_runs[top]
+        return ((from_hash ^ runs[from_height - move_count][move_count]) - from_hash
+                + (to_hash ^ runs[to_height][move_count]) - to_hash)
+    
+    def heuristic(self, tubes):
+        # Lower bound on the remaining moves. A move can remove at most one
+        # colour boundary inside a tube, or merge away one of the extra tubes
+        # that share a bottom colour, so the sum of both never overestimates.
+        boundaries = 0
+        filled = 0
+        bottoms = set()
+        for value in tubes:
+            if value:
+                info = self.info[value]
+                boundaries += info[4]
+                filled += 1
+                bottoms.add(info[5])
+        return boundaries + filled - len(bottoms)
+    
+    def successors(self, tubes, h, key, last=None):
+        # Every move from tubes with the two new tube values, the child's
+        # heuristic and the child's state hash. Both are updated from the
+        # touched tubes instead of rescanning the board.
+        info = self.info
+        low_mask = self.low_mask
+        runs = self.runs
+        bits = self.bits
+        zobrist_runs = self.zobrist_runs
+        hash_timer = self.hash_timer
+        
+        infos = list(map(info.__getitem__, tubes))
+        bottoms = {}
+        for from_info in infos:
+            if from_info[0]:
+                bottoms[from_info[5]] = bottoms.get(from_info[5], 0) + 1
+        
+        children = []
+        for from_idx, to_idx, move_count in self.moves(tubes, infos, last):
+            from_info = infos[from_idx]
+            to_info = infos[to_idx]
+            new_from = tubes[from_idx] & low_mask[from_info[0] - move_count]
+            new_to = tubes[to_idx] | (runs[from_info[1]][move_count] << (to_info[0] * bits))
+            
+            delta = info[new_from][4] - from_info[4] + info[new_to][4] - to_info[4]
+            if not new_from:
+                # One filled tube fewer, and maybe one bottom color fewer
+                delta -= 1
+                if bottoms[from_info[5]] == 1:
+                    delta += 1
+            if not to_info[0]:
+                # One filled tube more, and maybe one bottom color more
+                delta += 1
+                remaining = bottoms.get(from_info[1], 0)
+                if not new_from and from_info[5] == from_info[1]:
+                    remaining -= 1
+                if not remaining:
+                    delta -= 1
+            
+            if hash_timer is not None:
+                hash_timer("hashing")
+            moved = zobrist_runs[from_info[1]]
+            from_hash = from_info[7]
+            to_hash = to_info[7]
+            child_key = (key + (from_hash ^ moved[from_info[0] - move_count][move_count]) - from_hash
+                         + (to_hash ^ moved[to_info[0]][move_count]) - to_hash) & HASH_MASK
+            if hash_timer is not None:
+                hash_timer(None)
+            
+            children.append(((from_idx, to_idx, move_count), new_from, new_to, h + delta, child_key))
+        
+        return children
+    
+    def is_solved(self, tubes):
+        for value in tubes:
+            if value:
+                height, _, run = self.info[value][:3]
+                if run != height or height != self.stack_height:
+                    return False
+        return True
+    
+    def dead_end(self, tubes, last=None):
+        # Reason tubes can never be solved, or None if this check finds
+        # nothing. Only positions without an empty tube can be dead here:
+        # then every move pours a run onto the same color, so each top
+        # color's tubes only trade that color's top balls among themselves.
+        # A tube's top color changes only once its whole run fits in the
+        # free room of the other tubes of its group. If that holds for no
+        # tube, no top ball is ever uncovered, no tube empties and the
+        # mixed tubes stay mixed.
+        #
+        # A move that changes no tube's top color keeps this verdict, so
+        # the searches pass the last move and skip the check after such a
+        # move: the position it came from was expanded, so it was not dead.
+        if 0 in tubes:
+            return None
+        info = self.info
+        if last is not None:
+            from_info = info[tubes[last[0]]]
+            to_info = info[tubes[last[1]]]
+            if from_info[1] == to_info[1] and to_info[0] > last[2]:
+                return None
+        stack_height = self.stack_height
+        # The run fits iff the tube's room for its top color (free room
+        # plus top run) is at most the group's total free room, so per top
+        # color keep the free room and the least room of one tube. Tubes
+        # joining a group only help, so stop at the first that fits.
+        free = {}
+        least = {}
+        for value in tubes:
+            height, top, run = info[value][:3]
+            room = stack_height - height + run
+            if top in free:
+                free[top] += room - run
+                if room < least[top]:
+                    least[top] = room
+                if least[top] <= free[top]:
+                    return None
+            else:
+                free[top] = room - run
+                least[top] = room
+        if self.is_solved(tubes):
+            return None
+        
+        if all(info[value][0] == stack_height for value in tubes):
+            return "every tube is full"
+        tops = [info[value][1] for value in tubes]
+        if all(not free[top] or tops.count(top) == 1 for top in tops):
+            return "no legal move: no tube with room has a matching top ball"
+        return "no move can uncover a ball or empty a tube"
+
+
+def is_solved(grid, stack_height):
+    for stack in grid:
+        # Empty stacks are ok
+        if not stack:
+            continue
+
+        # If stack is not full, it's not solved
+        if len(stack) != stack_height:
+            return False
+
+        # If not all balls are the same color, it's not solved
+        first_color = stack[0]
+        if any(ball != first_color for ball in stack):
+            return False
+
+    return True
+
+
+def check_grid(grid, stack_height):
+    return find_unsolvable(grid, stack_height) is None
+
+
+def find_unsolvable(grid, stack_height):
+    # Cheap necessary conditions for a solution: no overfull tube, one
+    # tube's worth of balls per color, and a start that is not a dead end
+    # (see PackedBoard.dead_end, which the searches also apply to every
+    # node they expand). Returns the reason the puzzle cannot be solved, or
+    # None if these checks find nothing (the puzzle may still turn out
+    # unsolvable after a search).
+    for i, stack in enumerate(grid):
+        if len(stack) > stack_height:
+            return f"tube {i + 1} holds {len(stack)} balls but only has room for {stack_height}"
+
+    # Count balls of each color
+    color_counts = {}
+
+    for stack in grid:
+        for ball in stack:
+            color_counts[ball] = color_counts.get(ball, 0) + 1
+
+    # Check that each color has exactly stack_height balls
+    for color, count in sorted(color_counts.items()):
+        if count != stack_height:
+            return f"color {color} has {count} balls, expected {stack_height}"
+
+    # A dead position (see PackedBoard.dead_end)
+    board = PackedBoard(grid, stack_height, pruning=())
+    return board.dead_end(board.encode(grid))
+
+
+def count_movable_balls(from_stack, to_stack, stack_height):
+    # If source stack is empty, no balls can be moved
+    if not from_stack:
+        return 0
+
+    # Get the top ball from source
+    top_ball = from_stack[-1]
+
+    # Count how many identical balls are at the top
+    count = 0
+    for i in range(len(from_stack)-1, -1, -1):
+        if from_stack[i] == top_ball:
+            count += 1
+        else:
+            break
+
+    # If destination is empty, all identical balls can be moved
+    if not to_stack:
+        return count
+
+    # If destination's top ball is different, no balls can be moved
+    if to_stack[-1] != top_ball:
+        return 0
+
+    # If moving would exceed stack height, limit the count
+    if len(to_stack) + count > stack_height:
+        return stack_height - len(to_stack)
+
+    return count
+
+
+def get_valid_moves(grid, stack_height, pruning=DEFAULT_PRUNING, last_move=None):
+    board = PackedBoard(grid, stack_height, pruning)
+    return board.moves(board.encode(grid), last=last_move)
+
+
+def solve_best_first(grid, stack_height, weight=1.0, monitor=None, seed=None, table=None,
+                     pruning=DEFAULT_PRUNING, pdb=None):
+    # Best-first search over grid states ordered by f = g + weight * h.
+    # weight=1 is plain A* (shortest solution), weight > 1 is weighted A*
+    # (faster, at most weight times longer) and weight=None is greedy
+    # best-first search on the heuristic alone. States are packed tube
+    # tuples keyed by their Zobrist hash, which is the same for every
+    # permutation of the tubes, so moves stay in physical tube indices.
+    # monitor (a SearchMonitor) may report progress or abort the search.
+    # Equal priorities are broken first-in-first-out, or randomly if a seed
+    # is given. With a TranspositionTable the best-g map has a fixed size;
+    # paths are kept as parent chains hanging off the frontier entries, so
+    # dropped branches are freed as the search goes. pruning selects the
+    # PRUNING_RULES applied to move generation. A PatternDatabase for the
+    # board's shape (see ball_sort_pdb) raises the priorities to its
+    # estimate where that is higher; h itself stays the incremental one.
+    board = PackedBoard(grid, stack_height, pruning)
+    if monitor is None:
+        monitor = SearchMonitor()
+    monitor.instrument(board)
+    start = tuple(board.encode(grid))
+    start_h = board.heuristic(start)
+    start_key = board.state_hash(start)
+    estimate = pdb.estimator(board, len(grid)) if pdb is not None else None
+    estimate = monitor.timed("heuristic", estimate) if estimate is not None else None
+    start_f = priority(0, start_h if estimate is None else max(start_h, estimate(start)), weight)
+    if seed is None:
+        tie = itertools.count().__next__
+    else:
+        tie = random.Random(seed).random
+
+    best_g = {} if table is None else table
+    best_g[start_key] = 0
+    frontier = [(start_f, start_h, tie(), 0, start_key, start, None)]
+    # f = g_weight * g + h_weight * h, computed inline in the child loop
+    g_weight, h_weight = (0, 1) if weight is None else (1, weight)
+    get_g = best_g.get
+    push = heapq.heappush
+    pop = heapq.heappop
+
+    while frontier:
+        _, h, _, g, key, state, node = pop(frontier)
+        if g > get_g(key, g):
+            continue  # Stale queue entry, a shorter path was found since
+
+        monitor.tick(len(frontier))
+
+        if h == 0 and board.is_solved(state):
+            # Walk the (move, parent) links back to the start
+            path = []
+            while node is not None:
+                move, node = node
+                path.append(move)
+            path.reverse()
+            return path
+        last = node[0] if node is not None else None
+        if board.dead_end(state, last) is not None:
+            monitor.dead += 1
+            continue
+
+        child_g = g + 1
+        children = board.successors(state, h, key, last)
+        duplicates = 0
+        child_cost = g_weight * child_g
+        for move, new_from, new_to, child_h, child_key in children:
+            if child_g >= get_g(child_key, child_g + 1):
+                duplicates += 1
+                continue
+            best_g[child_key] = child_g
+
+            child = list(state)
+            child[move[0]] = new_from
+            child[move[1]] = new_to
+            child = tuple(child)
+            if estimate is None:
+                child_f = child_cost + h_weight * child_h
+            else:
+                child_f = child_cost + h_weight * max(child_h, estimate(child))
+            push(frontier, (child_f, child_h, tie(), child_g, child_key, child, (move, node)))
+        monitor.record(g, len(children), duplicates)
+
+    return None
+
+
+def priority(g, h, weight):
+    # Greedy search ignores the path cost entirely
+    if weight is None:
+        return h
+    return g + weight * h
+
+
+def solve_dfs(grid, stack_height, visited=None, monitor=None, seed=None, table=None,
+              pruning=DEFAULT_PRUNING):
+    # Depth-first search in get_valid_moves order, or in a random order
+    # drawn from seed when one is given. The search keeps its
+    # own stack of move iterators (one per depth) instead of recursing,
+    # so solution depth is not limited by Python's recursion limit.
+    # The monitor works as in solve_best_first, with the current depth
+    # reported as the frontier size. The Zobrist hashes of seen states go
+    # into the visited set, or into the bounded table if one is given;
+    # states on the current path are then tracked separately so evictions
+    # cannot cause cycles. pruning works as in solve_best_first.
+    board = PackedBoard(grid, stack_height, pruning)
+    if monitor is None:
+        monitor = SearchMonitor()
+    monitor.instrument(board)
+    tubes = board.encode(grid)
+    key = board.state_hash(tubes)
+    if table is not None:
+        visited = table
+        table[key] = 0
+        path_keys = {key}
+    else:
+        if visited is None:
+            visited = set()
+        visited.add(key)
+
+    if board.is_solved(tubes):
+        return []
+
+    if seed is None:
+        moves = board.moves
+    else:
+        shuffle = random.Random(seed).shuffle
+
+        def moves(tubes, last=None):
+            found = board.moves(tubes, last=last)
+            shuffle(found)
+            return found
+
+    path = []   # Moves applied so far
+    undo = []   # Tube values and state hash each applied move replaced
+    children = moves(tubes)
+    monitor.record(0, len(children))
+    stack = [iter(children)]
+
+    while stack:
+        move = next(stack[-1], None)
+        if move is None:
+            # All moves from this state tried, step back one move
+            stack.pop()
+            if path:
+                if table is not None:
+                    path_keys.discard(key)
+                from_idx, to_idx, _ = path.pop()
+                tubes[from_idx], tubes[to_idx], key = undo.pop()
+            continue
+
+        from_idx, to_idx, move_count = move
+        from_value, to_value = tubes[from_idx], tubes[to_idx]
+        child_key = (key + board.hash_delta(from_value, to_value, move_count)) & HASH_MASK
+        if child_key in visited or (table is not None and child_key in path_keys):
+            monitor.duplicates += 1
+            continue
+
+        tubes[from_idx], tubes[to_idx] = board.move(from_value, to_value, move_count)
+        path.append(move)
+        undo.append((from_value, to_value, key))
+        key = child_key
+        if table is None:
+            visited.add(key)
+        else:
+            table[key] = len(path)
+            path_keys.add(key)
+
+        if board.is_solved(tubes):
+            return path
+        if board.dead_end(tubes, move) is not None:
+            monitor.dead += 1
+            children = []
+        else:
+            children = moves(tubes, last=move)
+        monitor.record(len(path), len(children))
+        stack.append(iter(children))
+        monitor.tick(len(stack))
+
+    return None
+
+
+def solve_bidirectional(grid, stack_height, monitor=None, pruning=DEFAULT_PRUNING):
+    # Breadth-first search from both ends that meets in the middle, which
+    # explores about two searches of half the solution depth. Forward moves
+    # come from PackedBoard.moves (with the pruning rules); the backward
+    # search starts from one solved position and follows reverse_moves.
+    # Because Zobrist hashes ignore tube order, that one position stands for
+    # every solved arrangement, and a meeting only needs the same tubes in
+    # some order. Each step expands a whole layer of the smaller side, and
+    # the shortest meeting within that layer is kept, so the solution is a
+    # shortest one. monitor works as in solve_best_first.
+    board = PackedBoard(grid, stack_height, pruning)
+    if monitor is None:
+        monitor = SearchMonitor()
+    monitor.instrument(board)
+    start = tuple(board.encode(grid))
+    if board.is_solved(start):
+        return []
+    goal_grid = [color * stack_height for color in board.colors]
+    goal = tuple(board.encode(goal_grid + [''] * (len(grid) - len(goal_grid))))
+    
+    # Per side: hash -> (state, depth, node), node = (move, parent node)
+    forward = {board.state_hash(start): (start, 0, None)}
+    backward = {board.state_hash(goal): (goal, 0, None)}
+    forward_layer = [board.state_hash(start)]
+    backward_layer = [board.state_hash(goal)]
+    
+    while forward_layer and backward_layer:
+        expand_forward = len(forward_layer) <= len(backward_layer)
+        if expand_forward:
+            seen, other, layer = forward, backward, forward_layer
+        else:
+            seen, other, layer = backward, forward, backward_layer
+        
+        next_layer = []
+        meeting = None
+        for key in layer:
+            monitor.tick(len(forward_layer) + len(backward_layer))
+            state, depth, node = seen[key]
+            if expand_forward:
+                last = node[0] if node is not None else None
+                if board.dead_end(state, last) is not None:
+                    monitor.dead += 1
+                    moves = []
+                else:
+                    moves = board.moves(state, last=last)
+            else:
+                moves = board.reverse_moves(state)
+            
+            duplicates = 0
+            for move in moves:
+                from_idx, to_idx, move_count = move
+                from_value, to_value = state[from_idx], state[to_idx]
+                child_key = (key + board.hash_delta(from_value, to_value, move_count)) & HASH_MASK
+                if child_key in seen:
+                    duplicates += 1
+                    continue
+                child = list(state)
+                child[from_idx], child[to_idx] = board.move(from_value, to_value, move_count)
+                child = tuple(child)
+                seen[child_key] = (child, depth + 1, (move, node))
+                next_layer.append(child_key)
+                
+                match = other.get(child_key)
+                if match is not None and sorted(match[0]) == sorted(child):
+                    length = depth + 1 + match[1]
+                    if meeting is None or length < meeting[0]:
+                        meeting = (length, child_key)
+            monitor.record(depth, len(moves), duplicates)
+        
+        if meeting is not None:
+            return join_paths(forward[meeting[1]], backward[meeting[1]])
+        if expand_forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+    
+    return None
+
+
+def solve_ida(grid, stack_height, monitor=None, table=None, pruning=DEFAULT_PRUNING, pdb=None):
+    # Iterative-deepening A*: depth-first passes that cut every node with
+    # g + h above a bound, raising the bound to the smallest f that was cut
+    # until a pass finds a solution. Memory is linear in the solution depth
+    # (the current path and one successor list per depth), at the price of
+    # searching the shallow part of the tree again on every pass, and the
+    # solution is a shortest one since h never overestimates. Only states on
+    # the current path are excluded, so a state reachable in several ways
+    # is searched once per way; a TranspositionTable remembers the
+    # shallowest depth each state was reached at during the current pass
+    # and skips repeats, within its fixed memory. monitor works as in
+    # solve_dfs, pdb as in solve_best_first.
+    board = PackedBoard(grid, stack_height, pruning)
+    if monitor is None:
+        monitor = SearchMonitor()
+    monitor.instrument(board)
+    tubes = board.encode(grid)
+    h = board.heuristic(tubes)
+    if h == 0 and board.is_solved(tubes):
+        return []
+    key = board.state_hash(tubes)
+    estimate = pdb.estimator(board, len(grid)) if pdb is not None else None
+    estimate = monitor.timed("heuristic", estimate) if estimate is not None else None
+    
+    bound = h if estimate is None else max(h, estimate(tubes))
+    while True:
+        path, bound = ida_pass(board, tubes, h, key, bound, monitor, table, estimate)
+        if path is not None:
+            return path
+        if bound is None:
+            return None  # Nothing was cut, every reachable state was searched
+
+
+def ida_pass(board, tubes, h, key, bound, monitor, table, estimate=None):
+    # One depth-first pass of solve_ida with f = g + h <= bound, trying the
+    # successors with the lowest h first. Returns (path, None) on success,
+    # otherwise (None, next bound) where the next bound is the smallest f
+    # that was cut, or None if nothing was.
+    def successors(tubes, h, key, last, depth):
+        children = board.successors(tubes, h, key, last)
+        if last is not None:
+            # Moves between two other tubes commute with the last one, so
+            # only try each such pair of moves in one order
+            touched = (last[0], last[1])
+            children = [child for child in children
+                        if child[0] > last or child[0][0] in touched or child[0][1] in touched]
+        children.sort(key=lambda child: child[3])
+        monitor.record(depth, len(children))
+        return iter(children)
+    
+    if table is not None:
+        table.clear()
+    path = []         # Moves applied so far
+    undo = []         # Tube values, state hash and h each applied move replaced
+    path_keys = {key}
+    next_bound = None
+    stack = [successors(tubes, h, key, None, 0)]
+    
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            # All moves from this state tried, step back one move
+            stack.pop()
+            if path:
+                path_keys.discard(key)
+                from_idx, to_idx, _ = path.pop()
+                tubes[from_idx], tubes[to_idx], key, h = undo.pop()
+            continue
+        
+        move, new_from, new_to, child_h, child_key = child
+        child_g = len(path) + 1
+        f = child_g + child_h
+        if estimate is not None and f <= bound:
+            from_idx, to_idx, _ = move
+            child_state = list(tubes)
+            child_state[from_idx], child_state[to_idx] = new_from, new_to
+            f = child_g + max(child_h, estimate(child_state))
+        if f > bound:
+            if next_bound is None or f < next_bound:
+                next_bound = f
+            continue
+        if child_key in path_keys:
+            monitor.duplicates += 1
+            continue
+        if table is not None:
+            if table.get(child_key, child_g + 1) <= child_g:
+                monitor.duplicates += 1
+                continue
+            table[child_key] = child_g
+        
+        from_idx, to_idx, _ = move
+        undo.append((tubes[from_idx], tubes[to_idx], key, h))
+        tubes[from_idx], tubes[to_idx] = new_from, new_to
+        path.append(move)
+        key = child_key
+        h = child_h
+        path_keys.add(key)
+        
+        if h == 0 and board.is_solved(tubes):
+            return path, None
+        if board.dead_end(tubes, move) is not None:
+            monitor.dead += 1
+            stack.append(iter(()))
+        else:
+            stack.append(successors(tubes, h, key, move, len(path)))
+        monitor.tick(len(stack))
+    
+    return None, next_bound
+
+
+def join_paths(forward_end, backward_end):
+    # Forward moves from the start to the meeting state, followed by the
+    # backward search's reverse moves undone in the opposite order, with
+    # their tube indices mapped from the backward search's arrangement of
+    # the meeting state onto the forward search's one
+    state, _, node = forward_end
+    path = []
+    while node is not None:
+        move, node = node
+        path.append(move)
+    path.reverse()
+    
+    backward_state, _, node = backward_end
+    index_map = match_tubes(backward_state, state)
+    while node is not None:
+        (from_idx, to_idx, move_count), node = node
+        path.append((index_map[to_idx], index_map[from_idx], move_count))
+    return path
+
+
+def match_tubes(state, target):
+    # index_map[i] is the index in target of state's tube i, for two states
+    # holding the same tubes in different orders
+    positions = {}
+    for index, value in enumerate(target):
+        positions.setdefault(value, []).append(index)
+    return [positions[value].pop(0) for value in state]
+
+
+# Moves a resumed solve may take to get back onto a known solution path
+RESUME_DEPTH = 3
+
+
+class SolutionPath:
+    # A found solution remembered as the positions it passes through, so a
+    # later solve from a nearby position (part way along the path, or a few
+    # manual moves off it) can splice into the path instead of searching
+    # from scratch. optimal records whether the path is known to be a
+    # shortest solution (found by one of the OPTIMAL_MODES).
+    def __init__(self, grid, stack_height, moves, optimal=False):
+        self.board = PackedBoard(grid, stack_height)
+        self.tubes = len(grid)
+        self.moves = list(moves)
+        self.optimal = optimal
+        state = tuple(self.board.encode(grid))
+        self.states = [state]
+        for from_idx, to_idx, move_count in self.moves:
+            tubes = list(state)
+            tubes[from_idx], tubes[to_idx] = self.board.move(tubes[from_idx], tubes[to_idx],
+                                                             move_count)
+            state = tuple(tubes)
+            self.states.append(state)
+        
+        # Last index of every position on the path by its Zobrist hash,
+        # which matches the position in any tube order
+        self.index = {self.board.state_hash(state): i for i, state in enumerate(self.states)}
+    
+    def resume(self, grid, stack_height, max_depth=RESUME_DEPTH):
+        # Moves that solve grid by reaching a position of the path within
+        # max_depth moves (breadth-first) and following the path from there,
+        # the shortest such total; None if no position of the path is that
+        # close. With max_depth=0 the answer is a suffix of the path, which
+        # is a shortest solution if self.optimal is set.
+        board = self.board
+        if (len(grid) != self.tubes or stack_height != board.stack_height or
+                not set(''.join(grid)) <= set(board.colors)):
+            return None
+        
+        start = tuple(board.encode(grid))
+        start_key = board.state_hash(start)
+        parents = {start_key: None}
+        layer = [(start, start_key)]
+        best = None
+        for depth in range(max_depth + 1):
+            for state, key in layer:
+                index = self.index.get(key)
+                if index is not None and sorted(self.states[index]) == sorted(state):
+                    total = depth + len(self.moves) - index
+                    if best is None or total < best[0]:
+                        best = (total, state, key, index)
+            if depth == max_depth or (best is not None and best[0] <= depth + 1):
+                break
+            
+            next_layer = []
+            for state, key in layer:
+                for move in board.moves(state):
+                    from_idx, to_idx, move_count = move
+                    child_key = (key + board.hash_delta(state[from_idx], state[to_idx],
+                                                        move_count)) & HASH_MASK
+                    if child_key not in parents:
+                        parents[child_key] = (move, key)
+                        child = list(state)
+                        child[from_idx], child[to_idx] = board.move(state[from_idx], state[to_idx],
+                                                                    move_count)
+                        next_layer.append((tuple(child), child_key))
+            layer = next_layer
+        
+        if best is None:
+            return None
+        _, state, key, index = best
+        path = []
+        while parents[key] is not None:
+            move, key = parents[key]
+            path.append(move)
+        path.reverse()
+        
+        index_map = match_tubes(self.states[index], state)
+        for from_idx, to_idx, move_count in self.moves[index:]:
+            path.append((index_map[from_idx], index_map[to_idx], move_count))
+        return path
+    
+    def resume_solve(self, grid, stack_height, mode):
+        # resume() as a solve in mode may use it: the optimal modes take
+        # only an exact suffix of a path known to be shortest, the others
+        # any path within RESUME_DEPTH moves
+        if mode not in OPTIMAL_MODES:
+            return self.resume(grid, stack_height)
+        if not self.optimal:
+            return None
+        return self.resume(grid, stack_height, 0)
+
+
+# Longest stretch of a solution optimize_path tries to replace by a shorter
+# one; each step up multiplies its work by the branching factor
+OPTIMIZE_WINDOW = 4
+
+# Search modes accepted by solve(), the weight of each best-first mode and
+# the modes that always return a shortest solution
+MODES = ("astar", "weighted", "greedy", "dfs", "bidir", "ida")
+WEIGHTS = {"astar": 1.0, "weighted": 2.0, "greedy": None}
+OPTIMAL_MODES = ("astar", "bidir", "ida")
+
+
+def solve(grid, stack_height, mode="astar", monitor=None, seed=None, table=None,
+          pruning=DEFAULT_PRUNING, pdb=None):
+    # Solve grid with one of the MODES, returning the list of moves or None
+    # if there is no solution. Raises SearchAborted if the monitor stops it.
+    # seed randomises move order (dfs) or tie-breaks (best-first modes), and
+    # a TranspositionTable caps the memory used for duplicate detection
+    # (bidir takes neither, it needs the states of both frontiers to join
+    # the paths). pruning is the set of PRUNING_RULES used for move
+    # generation, and a PatternDatabase matching the board's shape
+    # sharpens the heuristic of the best-first modes and ida.
+    if mode not in MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(MODES)}")
+    if find_unsolvable(grid, stack_height) is not None:
+        return None
+    if mode == "dfs":
+        return solve_dfs(grid, stack_height, monitor=monitor, seed=seed, table=table,
+                         pruning=pruning)
+    if mode == "bidir":
+        return solve_bidirectional(grid, stack_height, monitor=monitor, pruning=pruning)
+    if mode == "ida":
+        return solve_ida(grid, stack_height, monitor=monitor, table=table, pruning=pruning,
+                         pdb=pdb)
+    return solve_best_first(grid, stack_height, WEIGHTS[mode], monitor=monitor, seed=seed,
+                            table=table, pruning=pruning, pdb=pdb)
+
+
+def solve_cached(cache, grid, stack_height, mode="astar", monitor=None, **options):
+    # solve() through a SolutionCache (see ball_sort_cache). A cached answer
+    # is returned without searching, unless an optimal mode asks for one
+    # that is not known to be shortest. New answers are stored, including
+    # proofs that there is no solution; aborted searches store nothing.
+    # Pruning rules outside DEFAULT_PRUNING can miss solutions, so under
+    # them only found solutions are stored, never as shortest.
+    cached = cache.get(grid, stack_height)
+    if cached is not None and (cached[1] or mode not in OPTIMAL_MODES):
+        return cached[0]
+    moves = solve(grid, stack_height, mode, monitor, **options)
+    if frozenset(options.get("pruning", DEFAULT_PRUNING)) <= DEFAULT_PRUNING:
+        cache.put(grid, stack_height, moves, moves is None or mode in OPTIMAL_MODES)
+    elif moves is not None:
+        cache.put(grid, stack_height, moves, False)
+    return moves
+
+
+def optimize_path(grid, stack_height, moves, window=OPTIMIZE_WINDOW):
+    # Shorten a solution found by a non-optimal mode. From each position on
+    # the path, every position reachable in fewer than window moves is
+    # looked up among the later positions of the path: a hit means the
+    # moves in between can be replaced by the shorter ones. Depth 0 cuts
+    # loops (e.g. a move undone later), depth 1 merges pairs like A>B, B>C
+    # into A>C, and reaching any solved position drops the rest of the path.
+    # Tube positions are matched exactly, so the result stays a valid
+    # solution of grid and is never longer than moves.
+    board = PackedBoard(grid, stack_height, pruning=())
+    path = list(moves)
+    states = [tuple(board.encode(grid))]
+    
+    i = 0
+    changed = True
+    while i < len(path):
+        if changed:
+            # Replay the path from position i and index the later positions
+            del states[i + 1:]
+            for from_idx, to_idx, move_count in path[i:]:
+                tubes = list(states[-1])
+                tubes[from_idx], tubes[to_idx] = board.move(tubes[from_idx], tubes[to_idx],
+                                                            move_count)
+                states.append(tuple(tubes))
+            last_seen = {state: j for j, state in enumerate(states)}
+        
+        shortcut = find_shortcut(board, states[i], i, last_seen, len(path), window)
+        changed = shortcut is not None
+        if changed:
+            end, replacement = shortcut
+            path[i:end] = replacement
+        else:
+            i += 1
+    
+    return path
+
+
+def find_shortcut(board, start, begin, last_seen, path_length, window):
+    # Breadth-first search from start, the path's position begin, up to
+    # window - 1 moves deep. Returns (end, moves) for the replacement that
+    # saves the most moves: moves lead from start to the path's position end
+    # (or end = path_length and moves reach any solved position), or None
+    # if nothing is saved. last_seen maps positions to their last index.
+    best = None
+    best_saving = 0
+    parents = {start: None}
+    layer = [start]
+    
+    for depth in range(window):
+        for state in layer:
+            end = last_seen.get(state)
+            if board.is_solved(state):
+                end = path_length
+            if end is not None and end - begin - depth > best_saving:
+                best = (end, state)
+                best_saving = end - begin - depth
+        if depth == window - 1:
+            break
+        
+        next_layer = []
+        for state in layer:
+            for move in board.moves(state):
+                from_idx, to_idx, move_count = move
+                tubes = list(state)
+                tubes[from_idx], tubes[to_idx] = board.move(tubes[from_idx], tubes[to_idx], move_count)
+                child = tuple(tubes)
+                if child not in parents:
+                    parents[child] = (move, state)
+                    next_layer.append(child)
+        layer = next_layer
+    
+    if best is None:
+        return None
+    end, state = best
+    replacement = []
+    while parents[state] is not None:
+        move, state = parents[state]
+        replacement.append(move)
+    replacement.reverse()
+    return end, replacement
+
+
+def apply_moves(grid, moves):
+    # Play moves on a copy of grid and return the resulting grid
+    grid = list(grid)
+    for from_idx, to_idx, move_count in moves:
+        grid[to_idx] += grid[from_idx][-move_count:]
+        grid[from_idx] = grid[from_idx][:-move_count]
+    return grid
+
+
+# Ball letters of generated puzzles, the GUI's default colors first
+PUZZLE_COLORS = "rgbypcomadefhijklnqstuvwxz"
+
+
+def random_puzzle(tubes, stack_height, rng=random, empty=2):
+    # Shuffled puzzle like the GUI's "New Random Puzzle": one color per
+    # filled tube, followed by empty tubes. rng may be a seeded Random.
+    colors = tubes - empty
+    if not 0 < colors <= len(PUZZLE_COLORS):
+        raise ValueError(f"Need 1 to {len(PUZZLE_COLORS)} filled tubes, got {colors}")
+    balls = [color for color in PUZZLE_COLORS[:colors] for _ in range(stack_height)]
+    rng.shuffle(balls)
+    return ([''.join(balls[i * stack_height:(i + 1) * stack_height]) for i in range(colors)] +
+            [''] * empty)
+
+
+def format_puzzle(grid):
+    # Inverse of parse_puzzle: tubes separated by spaces, "-" when empty
+    return ' '.join(tube or '-' for tube in grid)
+
+
+def parse_puzzle(line):
+    # "gbbb ybry yggy rrrg - -" or "gbbb,ybry,yggy,rrrg,," -> list of tubes
+    if ',' in line:
+        tubes = [tube.strip() for tube in line.split(',')]
+    else:
+        tubes = line.split()
+    return ['' if tube in ('-', '.') else tube for tube in tubes]
+
+
+def infer_stack_height(grid):
+    # Every color fills exactly one tube, so the height is the ball count per color
+    color_counts = {}
+    for stack in grid:
+        for ball in stack:
+            color_counts[ball] = color_counts.get(ball, 0) + 1
+    return max(color_counts.values(), default=0)
+
+
+def format_moves(moves):
+    # 1-based "from>to" pairs, matching the tube numbers shown in the GUI
+    return ' '.join(f"{from_idx+1}>{to_idx+1}" for from_idx, to_idx, _ in moves)
+
+
+def read_puzzles(stream):
+    for line in stream:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            yield parse_puzzle(line)
+
+
+def parse_pruning(text):
+    # --pruning value: comma-separated PRUNING_RULES, or "none"
+    if text.strip().lower() == "none":
+        return frozenset()
+    rules = frozenset(rule.strip() for rule in text.split(",") if rule.strip())
+    unknown = rules - set(PRUNING_RULES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown pruning rule(s) {', '.join(sorted(unknown))}")
+    return rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve Ball Sort puzzles without the GUI.")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="puzzle file, one puzzle per line (default: stdin)")
+    parser.add_argument("--height", type=int,
+                        help="tube height (default: number of balls per color)")
+    parser.add_argument("--mode", choices=MODES, default="astar",
+                        help="search mode (default: astar)")
+    parser.add_argument("--max-nodes", type=int,
+                        help="give up on a puzzle after expanding this many nodes")
+    parser.add_argument("--time-limit", type=float,
+                        help="give up on a puzzle after this many seconds")
+    parser.add_argument("--memory-mb", type=float,
+                        help="cap duplicate detection at this many MB (transposition table)")
+    parser.add_argument("--table-policy", choices=TranspositionTable.POLICIES, default="two-tier",
+                        help="transposition table replacement policy (default: two-tier)")
+    parser.add_argument("--pruning", type=parse_pruning, default=DEFAULT_PRUNING,
+                        help="comma-separated move pruning rules, or 'none' "
+                             f"(default: {','.join(r for r in PRUNING_RULES if r in DEFAULT_PRUNING)})")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="reuse and store solutions in this SQLite solution cache")
+    parser.add_argument("--pdb", metavar="DIR",
+                        help="use the pattern databases in DIR built by ball_sort_pdb.py")
+    parser.add_argument("--optimize", action="store_true",
+                        help="shorten solutions by re-searching short stretches of them")
+    parser.add_argument("--json", action="store_true",
+                        help="write one JSON object per puzzle instead of move lists")
+    parser.add_argument("--stats", action="store_true",
+                        help="report search statistics (in the JSON output, or on stderr)")
+    parser.add_argument("--timing", action="store_true",
+                        help="with --stats, also time move generation, hashing and heuristic")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run under cProfile, write the profile to FILE and list the "
+                             "top functions on stderr")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.file == "-" else open(args.file)
+    cache = None if args.cache is None else ball_sort_cache.SolutionCache(args.cache)
+    profiler = None
+    if args.profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    unsolved = 0
+    try:
+        for grid in read_puzzles(stream):
+            stack_height = args.height or infer_stack_height(grid)
+            reason = find_unsolvable(grid, stack_height)
+            stats = None
+            if reason is not None:
+                moves = None
+                error = "no solution"
+            else:
+                monitor = SearchMonitor(max_nodes=args.max_nodes, time_limit=args.time_limit,
+                                        timing=args.timing)
+                table = None
+                if args.memory_mb is not None:
+                    table = TranspositionTable(args.memory_mb, args.table_policy)
+                pdb = None
+                if args.pdb is not None:
+                    pdb = ball_sort_pdb.find_database(args.pdb, len(grid), stack_height,
+                                                      len(set(''.join(grid))))
+                options = {"table": table, "pruning": args.pruning, "pdb": pdb}
+                try:
+                    if cache is None:
+                        moves = solve(grid, stack_height, args.mode, monitor, **options)
+                    else:
+                        moves = solve_cached(cache, grid, stack_height, args.mode, monitor, **options)
+                    stats = monitor.stats()
+                    if moves is not None and args.optimize:
+                        moves = optimize_path(grid, stack_height, moves)
+                    error = None if moves is not None else "no solution"
+                except SearchAborted as aborted:
+                    moves = None
+                    error = aborted.reason
+                    stats = monitor.stats()
+
+            if moves is None:
+                unsolved += 1
+            if args.json:
+                result = {"puzzle": grid, "height": stack_height,
+                          "moves": moves, "error": error, "reason": reason}
+                if args.stats:
+                    result["stats"] = stats
+                print(json.dumps(result))
+            else:
+                if reason is not None:
+                    print(f"{error} ({reason})")
+                else:
+                    print(error or format_moves(moves))
+                if args.stats:
+                    print(json.dumps(stats), file=sys.stderr)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if cache is not None:
+            cache.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(
+                PROFILE_LINES)
+
+    return 1 if unsolved else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Tests of the SQLite solution cache and solve_cached."""
+import itertools
+
+import pytest
+
+import ball_sort_cache
+import ball_sort_solver as solver
+
+PUZZLE = ["gbbb", "ybry", "yggy", "rrrg", "", ""]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Entries get strictly increasing use times, so LRU order is exact
+    clock = itertools.count()
+    monkeypatch.setattr(ball_sort_cache.time, "time", lambda: float(next(clock)))
+    cache = ball_sort_cache.SolutionCache(str(tmp_path / "solutions.sqlite"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def replays(grid, stack_height, moves):
+    for move in moves:
+        assert move in solver.get_valid_moves(grid, stack_height, pruning=())
+        grid = solver.apply_moves(grid, [move])
+    return solver.is_solved(grid, stack_height)
+
+
+def test_canonical_key_ignores_tube_order_and_color_names():
+    key, _ = ball_sort_cache.canonical_puzzle(PUZZLE, 4)
+    shuffled = [PUZZLE[i] for i in (5, 3, 0, 4, 2, 1)]
+    recolored = [tube.translate(str.maketrans("rgby", "bryg")) for tube in shuffled]
+    assert ball_sort_cache.canonical_puzzle(recolored, 4)[0] == key
+    assert ball_sort_cache.canonical_puzzle(PUZZLE, 5)[0] != key
+
+
+def test_hit_maps_moves_onto_the_asked_tube_order(cache):
+    cache.put(PUZZLE, 4, solver.solve(PUZZLE, 4), True)
+    shuffled = [PUZZLE[i] for i in (5, 3, 0, 4, 2, 1)]
+    moves, optimal = cache.get(shuffled, 4)
+    assert optimal
+    assert replays(shuffled, 4, moves)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_optimal_flag_and_shorter_path_win(cache):
+    shortest = solver.solve(PUZZLE, 4, "astar")
+    longer = solver.solve(PUZZLE, 4, "dfs")
+    assert len(longer) > len(shortest)
+
+    cache.put(PUZZLE, 4, longer, False)
+    assert cache.get(PUZZLE, 4) == (longer, False)
+    cache.put(PUZZLE, 4, shortest, False)
+    assert cache.get(PUZZLE, 4) == (shortest, False)
+    cache.put(PUZZLE, 4, longer, False)   # Longer and no more optimal: kept out
+    assert cache.get(PUZZLE, 4) == (shortest, False)
+    cache.put(PUZZLE, 4, shortest, True)
+    cache.put(PUZZLE, 4, longer, False)   # Nothing replaces a proven entry
+    assert cache.get(PUZZLE, 4) == (shortest, True)
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    grids = [solver.parse_puzzle(line) for line in
+             ("rgb,gbr,brg,,", "rrg,gbb,bgr,,", "rgg,rbb,brg,,", "grb,gbr,brg,,")]
+    for grid in grids[:3]:
+        cache.put(grid, 3, solver.solve(grid, 3), True)
+    cache.get(grids[0], 3)   # Now the second is the least recently used
+    cache.put(grids[3], 3, solver.solve(grids[3], 3), True)
+    assert len(cache) == 3
+    assert cache.get(grids[1], 3) is None
+    assert all(cache.get(grid, 3) is not None for grid in (grids[0], grids[2], grids[3]))
+
+
+def test_solve_cached_reuses_and_upgrades_entries(cache):
+    fast = solver.solve_cached(cache, PUZZLE, 4, "dfs")
+    assert solver.solve_cached(cache, PUZZLE, 4, "greedy") == fast
+    shortest = solver.solve_cached(cache, PUZZLE, 4, "astar")
+    assert len(shortest) < len(fast)
+    assert cache.get(PUZZLE, 4) == (shortest, True)
+
+
+def test_unsound_pruning_stores_no_proofs(cache):
+    # lone-ball misses the only solutions of this puzzle
+    grid = solver.parse_puzzle("rgb,gbr,brg,,")
+    lone_ball = frozenset(("lone-ball",))
+    assert solver.solve_cached(cache, grid, 3, "astar", pruning=lone_ball) is None
+    assert cache.get(grid, 3) is None
+    assert len(solver.solve_cached(cache, grid, 3, "astar")) == 7
+
+    found = solver.solve_cached(cache, PUZZLE, 4, "astar", pruning=solver.DEFAULT_PRUNING | lone_ball)
+    assert cache.get(PUZZLE, 4) == (found, False)
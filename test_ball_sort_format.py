@@ -0,0 +1,74 @@
+"""Round-trip tests of the binary puzzle format and its text conversion."""
+import random
+
+import pytest
+
+import ball_sort_format
+import ball_sort_solver as solver
+
+
+def sample_puzzles():
+    # (grid, moves) pairs: solved, unsolvable and already solved puzzles
+    rng = random.Random(5)
+    puzzles = []
+    for _ in range(6):
+        grid = solver.random_puzzle(6, 4, rng)
+        puzzles.append((grid, solver.solve(grid, 4, "greedy")))
+    puzzles.append((["rgbb", "grrg", "bbgr", "", "", ""], None))
+    puzzles.append((["rrrr", "gggg", "bbbb", "yyyy", "", ""], []))
+    return puzzles
+
+
+def write(path, puzzles, solutions=True):
+    with ball_sort_format.PuzzleWriter(str(path), 6, 4, "rgby", solutions) as writer:
+        for grid, moves in puzzles:
+            writer.write(grid, moves if solutions else None)
+
+
+def test_binary_round_trip_keeps_puzzles_and_solutions(tmp_path):
+    puzzles = sample_puzzles()
+    write(tmp_path / "levels.bsp", puzzles)
+    with ball_sort_format.PuzzleReader(str(tmp_path / "levels.bsp")) as reader:
+        assert list(reader) == puzzles
+
+    write(tmp_path / "plain.bsp", puzzles, solutions=False)
+    with ball_sort_format.PuzzleReader(str(tmp_path / "plain.bsp")) as reader:
+        assert len(reader) == len(puzzles)
+        assert reader[-1] == puzzles[-1][0]
+
+
+def test_iter_puzzles_yields_the_header_height(tmp_path):
+    # Without its full columns the height could not be inferred
+    path = tmp_path / "short.bsp"
+    with ball_sort_format.PuzzleWriter(str(path), 3, 5, "rg") as writer:
+        writer.write(["rg", "gr", ""])
+    assert list(ball_sort_format.iter_puzzles(str(path))) == [(["rg", "gr", ""], 5)]
+
+
+@pytest.mark.parametrize("solutions", [True, False])
+def test_text_round_trip_keeps_solutions(tmp_path, solutions):
+    puzzles = sample_puzzles()
+    write(tmp_path / "levels.bsp", puzzles, solutions)
+    binary = (tmp_path / "levels.bsp").read_bytes()
+
+    assert ball_sort_format.main([str(tmp_path / "levels.bsp"), str(tmp_path / "levels.txt")]) == 0
+    assert ball_sort_format.main([str(tmp_path / "levels.txt"), str(tmp_path / "again.bsp")]) == 0
+    assert (tmp_path / "again.bsp").read_bytes() == binary
+
+
+def test_other_comments_carry_no_solution():
+    grid, moves, has_solution = ball_sort_format.parse_solution("gbbb ybry yggy rrrg - -  # length 9")
+    assert grid == ["gbbb", "ybry", "yggy", "rrrg", "", ""]
+    assert (moves, has_solution) == (None, False)
+    with pytest.raises(ValueError):
+        ball_sort_format.parse_solution("gbbb ybry yggy rrrg - -  # solution: 1>2")
+
+
+@pytest.mark.parametrize("solutions", [True, False])
+def test_truncated_file_is_rejected(tmp_path, solutions):
+    path = tmp_path / "levels.bsp"
+    write(path, sample_puzzles()[:3], solutions)
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        with ball_sort_format.PuzzleReader(str(path)) as reader:
+            list(reader)
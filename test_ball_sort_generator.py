@@ -0,0 +1,56 @@
+"""Tests that generated levels are well formed and solvable."""
+from collections import Counter
+
+import pytest
+
+import ball_sort_generator as generator
+import ball_sort_solver as solver
+
+
+def check_level(level, tubes, stack_height, empty):
+    # A full set of colors in tubes that fit, solved by the level's moves
+    grid, moves = level["puzzle"], level["moves"]
+    assert len(grid) == tubes
+    assert all(len(tube) <= stack_height for tube in grid)
+    assert Counter(''.join(grid)) == {color: stack_height
+                                      for color in solver.PUZZLE_COLORS[:tubes - empty]}
+    assert solver.find_unsolvable(grid, stack_height) is None
+    for move in moves:
+        assert move in solver.get_valid_moves(grid, stack_height, pruning=())
+        grid = solver.apply_moves(grid, [move])
+    assert solver.is_solved(grid, stack_height)
+
+
+@pytest.mark.parametrize("tubes, stack_height, empty, scramble",
+                         [(5, 3, 2, 10), (6, 4, 2, 30), (8, 4, 1, 60), (10, 5, 2, 200)])
+def test_scrambled_levels_are_valid_and_solvable(tubes, stack_height, empty, scramble):
+    levels = list(generator.scramble_levels(40, tubes, stack_height, scramble, seed=3,
+                                            empty=empty, jobs=1))
+    assert [level["index"] for level in levels] == list(range(40))
+    for level in levels:
+        check_level(level, tubes, stack_height, empty)
+        assert level["bound"] == len(level["moves"]) <= scramble
+        assert not solver.is_solved(level["puzzle"], stack_height)
+
+
+def test_scramble_bound_is_no_shorter_than_the_shortest_solution():
+    for level in generator.scramble_levels(20, 5, 3, 12, seed=4, jobs=1):
+        assert 0 < len(solver.solve(level["puzzle"], 3, "astar")) <= level["bound"]
+
+
+def test_scrambled_levels_depend_only_on_the_seed():
+    first = list(generator.scramble_levels(30, 7, 4, 40, seed=9, jobs=1))
+    assert list(generator.scramble_levels(30, 7, 4, 40, seed=9, jobs=2)) == first
+    assert list(generator.scramble_levels(30, 7, 4, 40, seed=10, jobs=1)) != first
+
+
+def test_graded_levels_are_in_range_and_solvable():
+    for level in generator.generate_levels(5, 5, 3, seed=2, min_length=6, max_length=9, jobs=1):
+        check_level(level, 5, 3, 2)
+        assert level["length"] == len(level["moves"]) and 6 <= level["length"] <= 9
+
+
+@pytest.mark.parametrize("tubes, empty", [(3, 3), (30, 2), (6, 0)])
+def test_scramble_rejects_impossible_shapes(tubes, empty):
+    with pytest.raises(ValueError):
+        list(generator.scramble_levels(1, tubes, 4, 10, empty=empty, jobs=1))
@@ -0,0 +1,244 @@
+"""Soundness checks for the pruning rules and the shortest-solution modes.
+
+Every search is compared against a plain breadth-first search over all
+legal moves (no pruning), on small seeded random boards where that search
+is exhaustive within a fraction of a second.
+"""
+import random
+from collections import deque
+
+import pytest
+
+import ball_sort_solver as solver
+
+# (tubes, stack height, empty tubes, boards) of the random boards checked
+BOARD_SHAPES = [(4, 3, 1, 40), (5, 3, 2, 40), (5, 4, 2, 30), (6, 3, 2, 20), (6, 4, 2, 10)]
+SEED = 20250101
+
+
+def random_boards():
+    rng = random.Random(SEED)
+    for tubes, stack_height, empty, count in BOARD_SHAPES:
+        for _ in range(count):
+            yield solver.random_puzzle(tubes, stack_height, rng, empty), stack_height
+
+
+BOARDS = list(random_boards())
+
+
+def bfs_length(grid, stack_height):
+    # Length of a shortest solution over every legal move, or None
+    start = tuple(sorted(grid))
+    depth = {start: 0}
+    queue = deque([list(grid)])
+    while queue:
+        state = queue.popleft()
+        key = tuple(sorted(state))
+        if solver.is_solved(state, stack_height):
+            return depth[key]
+        for move in solver.get_valid_moves(state, stack_height, pruning=()):
+            child = solver.apply_moves(state, [move])
+            child_key = tuple(sorted(child))
+            if child_key not in depth:
+                depth[child_key] = depth[key] + 1
+                queue.append(child)
+    return None
+
+
+BFS_LENGTHS = {}
+
+
+def shortest(grid, stack_height):
+    key = (tuple(grid), stack_height)
+    if key not in BFS_LENGTHS:
+        BFS_LENGTHS[key] = bfs_length(grid, stack_height)
+    return BFS_LENGTHS[key]
+
+
+def check_moves(grid, stack_height, moves):
+    # Play moves, each of which must be legal, and check they solve grid
+    for move in moves:
+        assert move in solver.get_valid_moves(grid, stack_height, pruning=())
+        grid = solver.apply_moves(grid, [move])
+    assert solver.is_solved(grid, stack_height)
+
+
+def test_boards_cover_both_outcomes():
+    lengths = [shortest(grid, stack_height) for grid, stack_height in BOARDS]
+    assert any(length is None for length in lengths)
+    assert any(length is not None and length > 5 for length in lengths)
+
+
+@pytest.mark.parametrize("pruning", [frozenset((rule,)) for rule in sorted(solver.DEFAULT_PRUNING)] +
+                         [solver.DEFAULT_PRUNING], ids=lambda rules: '+'.join(sorted(rules)))
+def test_default_rules_keep_astar_shortest(pruning):
+    for grid, stack_height in BOARDS:
+        moves = solver.solve(grid, stack_height, "astar", pruning=pruning)
+        expected = shortest(grid, stack_height)
+        if expected is None:
+            assert moves is None, grid
+        else:
+            assert moves is not None, grid
+            assert len(moves) == expected, grid
+            check_moves(grid, stack_height, moves)
+
+
+def test_lone_ball_is_unsound():
+    # Solving needs a lone ball moved into an empty tube, so with the
+    # original solver's rule the puzzle looks unsolvable
+    grid = solver.parse_puzzle("rgb,gbr,brg,,")
+    assert "lone-ball" not in solver.DEFAULT_PRUNING
+    assert shortest(grid, 3) == 7
+    assert solver.solve(grid, 3, "astar", pruning=frozenset(("lone-ball",))) is None
+    assert len(solver.solve(grid, 3, "astar")) == 7
+
+
+def test_dead_ends_are_never_solvable():
+    # Every position reached from the small boards that dead_end flags
+    for grid, stack_height in BOARDS[:40]:
+        board = solver.PackedBoard(grid, stack_height, pruning=())
+        seen = {tuple(sorted(grid))}
+        queue = deque([grid])
+        while queue:
+            state = queue.popleft()
+            if board.dead_end(board.encode(state)) is not None:
+                assert shortest(state, stack_height) is None, state
+            for move in solver.get_valid_moves(state, stack_height, pruning=()):
+                child = solver.apply_moves(state, [move])
+                if tuple(sorted(child)) not in seen:
+                    seen.add(tuple(sorted(child)))
+                    queue.append(child)
+
+
+@pytest.mark.parametrize("line, stack_height, reason", [
+    ("rgb,gbr,brgg,", 3, "tube 3 holds 4 balls but only has room for 3"),
+    ("rgb,gbr,brb,", 3, "color b has 4 balls, expected 3"),
+    ("rgb,gbr,brg", 3, "every tube is full"),
+    ("rb,gb,r,g", 2, "no legal move: no tube with room has a matching top ball"),
+    # Legal moves left, but the b balls only trade places on gbb and rb
+    ("gbb,gg,rb,rr", 3, "no move can uncover a ball or empty a tube"),
+])
+def test_unsolvable_rejected_without_search(line, stack_height, reason):
+    grid = solver.parse_puzzle(line)
+    assert solver.find_unsolvable(grid, stack_height) == reason
+    monitor = solver.SearchMonitor()
+    for mode in solver.MODES:
+        assert solver.solve(grid, stack_height, mode, monitor) is None
+    assert monitor.expanded == 0
+
+
+def test_search_cuts_dead_ends():
+    grid = solver.parse_puzzle("ggr,gbb,rbr,")
+    assert solver.find_unsolvable(grid, 3) is None
+    for mode in solver.MODES:
+        monitor = solver.SearchMonitor()
+        assert solver.solve(grid, 3, mode, monitor) is None
+        assert monitor.dead > 0, mode
+
+
+@pytest.mark.parametrize("mode", solver.OPTIMAL_MODES)
+def test_optimal_modes_match_bfs(mode):
+    for grid, stack_height in BOARDS:
+        moves = solver.solve(grid, stack_height, mode)
+        expected = shortest(grid, stack_height)
+        if expected is None:
+            assert moves is None, grid
+        else:
+            assert moves is not None, grid
+            assert len(moves) == expected, grid
+            check_moves(grid, stack_height, moves)
+
+
+@pytest.mark.parametrize("mode", solver.MODES)
+def test_timing_reports_hashing(mode):
+    grid = solver.random_puzzle(8, 4, random.Random(SEED))
+    monitor = solver.SearchMonitor(timing=True)
+    solver.solve(grid, 4, mode, monitor)
+    assert monitor.timings["hashing"] > 0
+
+
+def test_two_tier_table_demotes_replaced_entries():
+    table = solver.TranspositionTable(policy="two-tier")
+    bucket = table.buckets
+    first, second, third = 1 + bucket, 1 + 2 * bucket, 1 + 3 * bucket  # One bucket
+    table[first] = 5
+    table[second] = 7   # Deeper: always-replace slot
+    table[third] = 3    # Shallower: preferred slot, first moves down, second goes
+    assert table.get(third) == 3 and table.get(first) == 5 and second not in table
+    assert (len(table), table.evicted) == (2, 1)
+    table.clear()
+    assert (len(table), table.evicted) == (0, 0)
+
+
+@pytest.mark.parametrize("mode", ["dfs", "greedy"])
+def test_optimize_path_keeps_a_solution_no_longer(mode):
+    shortened = 0
+    for grid, stack_height in BOARDS:
+        moves = solver.solve(grid, stack_height, mode)
+        if moves is None:
+            continue
+        optimized = solver.optimize_path(grid, stack_height, moves)
+        assert len(optimized) <= len(moves), grid
+        assert len(optimized) >= shortest(grid, stack_height), grid
+        check_moves(grid, stack_height, optimized)
+        shortened += len(optimized) < len(moves)
+    assert shortened > 0
+
+
+def test_optimize_path_cuts_loops_and_merges_moves():
+    grid = solver.parse_puzzle("rgb,gbr,brg,,")
+    moves = solver.solve(grid, 3, "astar")
+    # The first move split over the spare tube, then a move undone at once
+    from_idx, to_idx, move_count = moves[0]
+    spare = next(i for i in range(len(grid)) if i not in (from_idx, to_idx) and not grid[i])
+    padded = [(from_idx, spare, move_count), (spare, to_idx, move_count)]
+    after = solver.apply_moves(grid, padded)
+    loop = next(move for move in solver.get_valid_moves(after, 3, pruning=())
+                if (move[1], move[0], move[2]) in
+                solver.get_valid_moves(solver.apply_moves(after, [move]), 3, pruning=()))
+    padded += [loop, (loop[1], loop[0], loop[2])] + moves[1:]
+    check_moves(grid, 3, padded)
+    assert solver.optimize_path(grid, 3, padded) == moves
+
+
+def test_resume_from_the_middle_of_a_solution():
+    spliced = 0
+    for grid, stack_height in BOARDS:
+        moves = solver.solve(grid, stack_height, "dfs")
+        if moves is None:
+            continue
+        path = solver.SolutionPath(grid, stack_height, moves)
+        for k in range(len(moves) + 1):
+            middle = solver.apply_moves(grid, moves[:k])
+            resumed = path.resume(middle, stack_height, 0)
+            assert resumed is not None and len(resumed) <= len(moves) - k, grid
+            check_moves(middle, stack_height, resumed)
+            # A manual move off the path may splice back in within RESUME_DEPTH
+            for move in solver.get_valid_moves(middle, stack_height, pruning=()):
+                off = solver.apply_moves(middle, [move])
+                resumed = path.resume(off, stack_height)
+                if resumed is not None:
+                    check_moves(off, stack_height, resumed)
+                    spliced += 1
+    assert spliced > 0
+
+
+def test_optimal_modes_resume_only_a_shortest_path():
+    grid = solver.parse_puzzle("rgb,gbr,brg,,")
+    moves = solver.solve(grid, 3, "astar")
+    middle = solver.apply_moves(grid, moves[:3])
+    assert not solver.SolutionPath(grid, 3, moves).optimal
+    for mode in solver.MODES:
+        path = solver.SolutionPath(grid, 3, moves)
+        resumed = path.resume_solve(middle, 3, mode)
+        assert (resumed is None) == (mode in solver.OPTIMAL_MODES), mode
+        path = solver.SolutionPath(grid, 3, moves, optimal=True)
+        assert path.resume_solve(middle, 3, mode) == moves[3:], mode
+    # Off the path, only the other modes search around it
+    path = solver.SolutionPath(grid, 3, moves, optimal=True)
+    on_path = [sorted(solver.apply_moves(grid, moves[:k])) for k in range(len(moves) + 1)]
+    off = next(child for child in (solver.apply_moves(middle, [move]) for move in
+                                   solver.get_valid_moves(middle, 3, pruning=()))
+               if sorted(child) not in on_path)
+    assert path.resume_solve(off, 3, "astar") is None
+    check_moves(off, 3, path.resume_solve(off, 3, "dfs"))